@@ -0,0 +1,126 @@
+"""
+Synthetic image corpus for benchmarks
+
+Usage: python -m benchmarks.corpus <folder> [--per-kind N] [--resolutions 1280x720 1920x1080] [--formats JPEG PNG] [--seed S]
+
+Every image has random content in the middle and edges of one kind:
+monochrome (should pass any deviation filter), noisy, gradient and striped.
+The same arguments always produce the same files.
+"""
+import argparse
+import os
+
+import numpy as np
+from PIL import Image
+
+EDGE_KINDS = ("monochrome", "noisy", "gradient", "striped")
+DEFAULT_RESOLUTIONS = ((1280, 720), (1920, 1080), (1080, 1920))
+DEFAULT_FORMATS = ("JPEG", "PNG", "BMP")
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "BMP": "bmp", "WEBP": "webp"}
+
+# Part of the width on each side filled with the edge pattern
+EDGE_WIDTH = 0.1
+
+
+def make_edge(kind: str, height: int, width: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Creates one edge band
+
+    Args:
+        kind (str): one of EDGE_KINDS
+        height (int): band height
+        width (int): band width
+        rng (np.random.Generator): source of colors and noise
+
+    Returns:
+        np.ndarray: (height, width, 3) uint8 array
+    """
+    color = rng.integers(0, 256, 3)
+    if kind == "monochrome":
+        column = np.broadcast_to(color, (height, 3))
+    elif kind == "noisy":
+        column = color + rng.normal(0, 12, (height, 3))
+    elif kind == "gradient":
+        other_color = rng.integers(0, 256, 3)
+        column = np.linspace(color, other_color, height)
+    elif kind == "striped":
+        other_color = rng.integers(0, 256, 3)
+        stripe_height = int(rng.integers(8, 33))
+        stripes = (np.arange(height) // stripe_height) % 2
+        column = np.where(stripes[:, None] == 0, color, other_color)
+    else:
+        raise ValueError(f"Unknown edge kind {kind}")
+    column = np.clip(column, 0, 255).astype(np.uint8)
+    return np.repeat(column[:, None, :], width, axis=1)
+
+
+def make_image(kind: str, width: int, height: int, rng: np.random.Generator) -> Image.Image:
+    # Middle is blurred noise, so it compresses like a photo rather than like pure noise
+    middle = rng.integers(0, 256, (height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+    pixels = np.array(Image.fromarray(middle).resize((width, height), Image.Resampling.BILINEAR))
+
+    edge_width = max(1, int(width * EDGE_WIDTH))
+    pixels[:, :edge_width] = make_edge(kind, height, edge_width, rng)
+    pixels[:, width - edge_width:] = make_edge(kind, height, edge_width, rng)
+    return Image.fromarray(pixels)
+
+
+def generate_corpus(
+    folder: str,
+    per_kind: int = 2,
+    resolutions: tuple[tuple[int, int], ...] = DEFAULT_RESOLUTIONS,
+    formats: tuple[str, ...] = DEFAULT_FORMATS,
+    seed: int = 0
+) -> list[str]:
+    """
+    Writes per_kind images for every edge kind, resolution and format. Existing files are kept,
+    so a corpus is generated once and reused between runs.
+
+    Args:
+        folder (str): destination folder
+        per_kind (int, optional): images of every kind, resolution and format. Defaults to 2.
+        resolutions (tuple[tuple[int, int], ...], optional): (width, height) pairs. Defaults to DEFAULT_RESOLUTIONS.
+        formats (tuple[str, ...], optional): Pillow format names. Defaults to DEFAULT_FORMATS.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        list[str]: paths of corpus files
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for kind_index, kind in enumerate(EDGE_KINDS):
+        for width, height in resolutions:
+            for image_format in formats:
+                for i in range(per_kind):
+                    path = os.path.join(folder, f"{kind}_{width}x{height}_{i}.{EXTENSIONS[image_format]}")
+                    paths.append(path)
+                    if os.path.exists(path):
+                        continue
+                    # Own seed for every file, so adding formats or resolutions does not change other files
+                    rng = np.random.default_rng([seed, kind_index, width, height, i])
+                    image = make_image(kind, width, height, rng)
+                    image.save(path, image_format, **({"quality": 90} if image_format in ("JPEG", "WEBP") else {}))
+    return paths
+
+
+def parse_resolution(value: str) -> tuple[int, int]:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark images")
+    parser.add_argument("folder")
+    parser.add_argument("--per-kind", type=int, default=2)
+    parser.add_argument("--resolutions", nargs="+", type=parse_resolution, default=DEFAULT_RESOLUTIONS)
+    parser.add_argument("--formats", nargs="+", choices=tuple(EXTENSIONS), default=DEFAULT_FORMATS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.folder, args.per_kind, tuple(args.resolutions), tuple(args.formats), args.seed)
+    total_size = sum(os.path.getsize(path) for path in paths)
+    print(f"{len(paths)} files, {total_size / 1024 / 1024:.1f} MB in {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of utils.hashing options on real files
+
+Usage: python -m benchmarks.hashing <file or folder> [<file or folder> ...] [--partial-size MB] [--repeat N]
+
+Files are read once before measuring, so numbers show hashing speed with a warm page cache.
+"""
+import argparse
+import hashlib
+import os
+import time
+
+from src.utils.hashing import get_file_hash, get_hash_algorithms
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def get_legacy_md5(name: str) -> str:
+    # get_file_md5 before the hashing subsystem, kept as a baseline
+    hash_md5 = hashlib.md5()
+    with open(name, "rb") as file:
+        for chunk in iter(lambda: file.read(4096), b""):
+            hash_md5.update(chunk)
+
+    return hash_md5.hexdigest()
+
+
+def collect_files(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        for folder, _, names in os.walk(path):
+            files.extend(os.path.join(folder, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+    return files
+
+
+def measure(files: list[str], repeat: int, hash_function) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for file in files:
+            hash_function(file)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of file hashing options")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--partial-size", type=int, default=4, help="MB hashed from each end in partial mode")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    total_size = sum(os.path.getsize(file) for file in files)
+    if not files:
+        print("No files found")
+        return
+
+    for file in files:
+        get_file_hash(file, "md5")
+
+    options = [("md5 (4 KB chunks, legacy)", get_legacy_md5)]
+    for algorithm in get_hash_algorithms():
+        options.append((algorithm, lambda file, algorithm=algorithm: get_file_hash(file, algorithm)))
+        options.append((
+            f"{algorithm} partial {args.partial_size} MB",
+            lambda file, algorithm=algorithm: get_file_hash(file, algorithm, args.partial_size)
+        ))
+
+    print(f"{len(files)} files, {total_size / 1024 / 1024:.1f} MB, best of {args.repeat}")
+    print(f"{'option':<32}{'seconds':>10}{'MB/s':>12}")
+    for name, hash_function in options:
+        seconds = measure(files, args.repeat, hash_function)
+        print(f"{name:<32}{seconds:>10.3f}{total_size / 1024 / 1024 / seconds:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
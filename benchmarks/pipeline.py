@@ -0,0 +1,240 @@
+"""
+Benchmark of scan, copy and enlarge pipelines on a synthetic corpus
+
+Usage: python -m benchmarks.pipeline [--corpus folder] [--output results.json] [--compare old.json] [--repeat N]
+
+Everything runs in a temporary working folder, settings.json and existing dbs are not touched.
+Stages are timed one by one in this process, end to end numbers come from Scaner.run, Copier.run
+and EnlargeImages.run with the settings from --settings and benchmark paths.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from collections.abc import Callable
+
+from PIL import Image
+
+from src.backend.copier import Copier
+from src.backend.db_writer import ResultWriter
+from src.backend.enlarger import EnlargeImages
+from src.backend.scaner import Scaner
+from src.utils.files_IO import read_json_file
+from src.utils.hashing import get_file_hash
+
+from .corpus import DEFAULT_FORMATS, DEFAULT_RESOLUTIONS, generate_corpus
+
+STAGES = ("hash", "decode", "edge_extraction", "delta_e", "db_write")
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_runs(function: Callable[[], None], repeat: int, before: Callable[[], None] | None = None) -> list[float]:
+    runs = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def summarize(runs: list[float], items: int, total_bytes: int) -> dict:
+    best = min(runs)
+    return {
+        "seconds": best,
+        "runs": runs,
+        "items": items,
+        "items_per_second": items / best if best > 0 else None,
+        "mb_per_second": total_bytes / 2**20 / best if best > 0 else None
+    }
+
+
+def remove_path(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def benchmark_stages(files: list[str], settings: dict, repeat: int) -> dict[str, list[float]]:
+    """
+    Times every scan stage over the whole corpus, stages run one after another on the same images
+
+    Returns:
+        dict[str, list[float]]: stage name to seconds of every repeat
+    """
+    scaner = Scaner()
+    scaner.settings = dict(settings)
+    scaner.prepare_settings()
+    scaner.existing_md5s = set()
+    scaner.files_index = {}
+    decode_scale = scaner.settings["decode_scale"]
+
+    def decode(file: str) -> tuple[Image.Image, int]:
+        img = Image.open(file)
+        width = img.width
+        if decode_scale > 1 and img.format == "JPEG":
+            img.draft("RGB", (img.width // decode_scale, img.height // decode_scale))
+        img.load()
+        return img, width // img.width
+
+    images = [decode(file) for file in files]
+    strips = [scaner.get_edge_strips(img) for img, _ in images]
+    statements = [scaner.scan_file(file) for file in files]
+
+    def write():
+        db_path = "./stages.db"
+        for suffix in ("", "-wal", "-shm"):
+            remove_path(db_path + suffix)
+        scaner.connection = sqlite3.connect(db_path)
+        scaner.cursor = scaner.connection.cursor()
+        scaner.create_tables()
+        scaner.connection.close()
+        writer = ResultWriter(db_path, lambda _: None, scaner.settings["db_batch_size"], scaner.settings["db_flush_interval"])
+        writer.start()
+        for item in statements:
+            writer.put(item)
+        writer.close()
+
+    stage_functions = {
+        "hash": lambda: [
+            get_file_hash(file, scaner.settings["hash_algorithm"], scaner.settings["partial_hash_size"]) for file in files
+        ],
+        "decode": lambda: [decode(file) for file in files],
+        "edge_extraction": lambda: [scaner.get_edge_strips(img) for img, _ in images],
+        "delta_e": lambda: [
+            scaner.get_edges_deviations(left_strip, right_strip, scale) for (_, scale), (left_strip, right_strip) in zip(images, strips)
+        ],
+        "db_write": write
+    }
+    return {stage: time_runs(stage_functions[stage], repeat) for stage in STAGES}
+
+
+def run_benchmarks(corpus: list[str], base_settings: dict, repeat: int) -> dict:
+    total_bytes = sum(os.path.getsize(file) for file in corpus)
+    corpus_folder = os.path.dirname(os.path.abspath(corpus[0]))
+    settings = base_settings | {
+        "scan_folder": corpus_folder,
+        "scan_folder_subfolders": False,
+        "db_name": "benchmark",
+        "copier_db_name": "benchmark",
+        "result_copy_folder": os.path.abspath("copied"),
+        # Filters pass everything, so copier time is not hidden by the corpus content
+        "minimum_width": 0,
+        "minimum_height": 0,
+        "maximum_deviation": 1000,
+        "enlarger_source_folder": corpus_folder,
+        "enlarger_result_folder": os.path.abspath("enlarged"),
+        "enlarger_small_folder": os.path.abspath("small"),
+        "enlarger_min_height": 0
+    }
+    results = {}
+
+    for stage, runs in benchmark_stages(corpus, settings, repeat).items():
+        results[f"scan.stage.{stage}"] = summarize(runs, len(corpus), total_bytes)
+
+    def remove_db():
+        for suffix in ("", "-wal", "-shm"):
+            remove_path(f"./benchmark.db{suffix}")
+
+    def run(engine_class) -> Callable[[], None]:
+        def run_engine():
+            engine = engine_class()
+            engine.settings = dict(settings)
+            engine.run()
+        return run_engine
+
+    results["scan.cold"] = summarize(time_runs(run(Scaner), repeat, remove_db), len(corpus), total_bytes)
+    # Db from the last cold run is kept, every file is skipped by the stat index
+    results["scan.unchanged"] = summarize(time_runs(run(Scaner), repeat), len(corpus), 0)
+    results["copy"] = summarize(
+        time_runs(run(Copier), repeat, lambda: remove_path(settings["result_copy_folder"])), len(corpus), total_bytes
+    )
+
+    def clear_enlarged():
+        remove_path(settings["enlarger_result_folder"])
+        remove_path(settings["enlarger_small_folder"])
+    results["enlarge"] = summarize(time_runs(run(EnlargeImages), repeat, clear_enlarged), len(corpus), total_bytes)
+    return results
+
+
+def print_results(results: dict, baseline: dict | None):
+    header = f"{'benchmark':<28}{'seconds':>10}{'img/s':>10}{'MB/s':>10}"
+    print(header + (f"{'vs base':>10}" if baseline else ""))
+    for name, result in results.items():
+        line = f"{name:<28}{result['seconds']:>10.3f}{result['items_per_second'] or 0:>10.1f}{result['mb_per_second'] or 0:>10.1f}"
+        if baseline and name in baseline:
+            # > 1 means faster than the baseline
+            line += f"{baseline[name]['seconds'] / result['seconds']:>9.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of scan, copy and enlarge pipelines")
+    parser.add_argument("--corpus", help="corpus folder, generated if missing. Defaults to a temporary folder")
+    parser.add_argument("--per-kind", type=int, default=1, help="images of every kind, resolution and format")
+    parser.add_argument("--settings", default="./settings.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="./benchmark_results.json")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    args = parser.parse_args()
+
+    base_settings = read_json_file(args.settings)
+    # Lab table is shared with normal runs instead of being rebuilt in the temporary folder
+    base_settings["lab_table_folder"] = os.path.abspath(base_settings.get("lab_table_folder", "./cache"))
+    output_path = os.path.abspath(args.output)
+    baseline = read_json_file(args.compare)["results"] if args.compare else None
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="wallpaper-benchmark-") as workdir:
+        corpus_folder = os.path.abspath(args.corpus) if args.corpus else os.path.join(workdir, "corpus")
+        corpus = generate_corpus(corpus_folder, args.per_kind, DEFAULT_RESOLUTIONS, DEFAULT_FORMATS)
+        corpus_mb = sum(os.path.getsize(file) for file in corpus) / 2**20
+        os.chdir(workdir)
+        try:
+            results = run_benchmarks(corpus, base_settings, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+            "corpus_files": len(corpus),
+            "corpus_mb": corpus_mb,
+            "settings": {
+                key: base_settings.get(key) for key in (
+                    "scan_backend", "threads_amount", "deviation_engine", "hash_algorithm",
+                    "partial_hash_size", "decode_scale", "adaptive_sampling", "color_algorithm"
+                )
+            }
+        },
+        "results": results
+    }
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=4)
+
+    print_results(results, baseline)
+    print(f"Results are written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
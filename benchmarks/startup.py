@@ -0,0 +1,138 @@
+"""
+Benchmark of import time of the GUI, the command line tool and every backend
+
+Usage: python -m benchmarks.startup [--output startup_results.json] [--compare old.json] [--max-regression 1.2] [--repeat N]
+
+Every target is imported in a fresh interpreter with -X importtime, the best of --repeat runs is kept.
+Page cache is warm after the first run, so numbers show interpreter work rather than disk reads.
+With --compare and --max-regression the exit code is 1 if a target got slower than the baseline by more than that ratio.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.utils.files_IO import read_json_file
+
+from .pipeline import get_git_commit
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = {
+    "gui": "import src.frontend.pyqt",
+    "cli": "import src.__main__",
+    "scan": "import src.backend.scaner",
+    "copy": "import src.backend.copier",
+    "enlarge": "import src.backend.enlarger",
+    "watch": "import src.backend.watcher"
+}
+
+
+def parse_importtime(output: str) -> tuple[int, dict[str, tuple[int, int]]]:
+    """
+    Parses stderr of python -X importtime
+
+    Returns:
+        tuple[int, dict[str, tuple[int, int]]]: total microseconds, module name to its (self, cumulative) microseconds
+    """
+    total = 0
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_time), int(cumulative))
+        # Nested imports are indented, cumulative time of top level ones adds up to the whole import
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total, modules
+
+
+def measure_target(code: str, repeat: int, workdir: str) -> dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=workdir, env=os.environ | {"PYTHONPATH": ROOT_FOLDER}, capture_output=True, text=True, check=False
+        )
+        wall = time.perf_counter() - start
+        if process.returncode != 0:
+            return {"error": process.stderr.strip().splitlines()[-1]}
+        total, modules = parse_importtime(process.stderr)
+        if best is None or total < best["import_seconds"] * 10**6:
+            best = {"import_seconds": total / 10**6, "wall_seconds": wall, "modules": modules}
+
+    slowest = sorted(best.pop("modules").items(), key=lambda item: item[1][0], reverse=True)[:10]
+    best["slowest_modules"] = {name: {"self_ms": own / 1000, "cumulative_ms": cumulative / 1000} for name, (own, cumulative) in slowest}
+    return best
+
+
+def print_results(results: dict, baseline: dict | None):
+    header = f"{'target':<10}{'import ms':>11}{'wall ms':>10}"
+    print(header + (f"{'vs base':>10}" if baseline else ""))
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<10} failed: {result['error']}")
+            continue
+        line = f"{name:<10}{result['import_seconds'] * 1000:>11.1f}{result['wall_seconds'] * 1000:>10.1f}"
+        if baseline and "import_seconds" in baseline.get(name, {}):
+            # > 1 means faster than the baseline
+            line += f"{baseline[name]['import_seconds'] / result['import_seconds']:>9.2f}x"
+        print(line)
+        for module, stats in list(result["slowest_modules"].items())[:3]:
+            print(f"    {module:<40}{stats['self_ms']:>8.1f} ms self{stats['cumulative_ms']:>10.1f} ms cumulative")
+
+
+def get_regressions(results: dict, baseline: dict, max_ratio: float) -> list[str]:
+    return [
+        name for name, result in results.items()
+        if "import_seconds" in result and "import_seconds" in baseline.get(name, {})
+        and result["import_seconds"] > baseline[name]["import_seconds"] * max_ratio
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of startup import time")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="./startup_results.json")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    parser.add_argument("--max-regression", type=float, help="fail if import time grew more than this ratio over --compare")
+    args = parser.parse_args()
+
+    baseline = read_json_file(args.compare)["results"] if args.compare else None
+    # Loggers create a logs folder in the working folder
+    with tempfile.TemporaryDirectory(prefix="wallpaper-startup-") as workdir:
+        results = {name: measure_target(TARGETS[name], args.repeat, workdir) for name in args.targets}
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+    output_path = os.path.abspath(args.output)
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=4)
+
+    print_results(results, baseline)
+    print(f"Results are written to {output_path}")
+
+    if baseline and args.max_regression:
+        regressions = get_regressions(results, baseline, args.max_regression)
+        if regressions:
+            print(f"Import time regressed over {args.max_regression}x: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Headless entry point: python -m src {scan,copy,enlarge,watch,similar} [--settings ./settings.json]
+
+Backends are imported only for the chosen command and PyQt6 is never imported.
+"""
+import argparse
+import sys
+
+from .utils.files_IO import read_json_file
+from .utils.progress import ProgressSnapshot
+
+
+class ConsoleReporter:
+    """
+    Prints engine signals to stderr, so stdout stays free for piping
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+
+    def on_progress(self, snapshot: ProgressSnapshot):
+        print(f"\r{self.label}: {snapshot.format()}\033[K", end="", file=sys.stderr, flush=True)
+
+    def on_message(self, message: str):
+        print(f"\n{message.rstrip()}", file=sys.stderr, flush=True)
+
+    def finish(self):
+        print(file=sys.stderr, flush=True)
+
+
+def create_engine(command: str):
+    if command == "scan":
+        from .backend.scaner import Scaner # pylint: disable=import-outside-toplevel
+        return Scaner()
+    if command == "copy":
+        from .backend.copier import Copier # pylint: disable=import-outside-toplevel
+        return Copier()
+    if command == "watch":
+        from .backend.watcher import FolderWatcher # pylint: disable=import-outside-toplevel
+        return FolderWatcher()
+    from .backend.enlarger import EnlargeImages # pylint: disable=import-outside-toplevel
+    return EnlargeImages()
+
+
+def show_similar(settings: dict, image_path: str | None, radius: int):
+    """
+    Prints near-duplicates of image_path, or every group of near-duplicates in the db without it
+    """
+    import sqlite3 # pylint: disable=import-outside-toplevel
+
+    from PIL import Image # pylint: disable=import-outside-toplevel
+
+    from .backend import similarity # pylint: disable=import-outside-toplevel
+
+    connection = sqlite3.connect(f"./{settings['db_name']}.db")
+    rows = connection.execute("SELECT path, width, height, dhash FROM pictures WHERE dhash IS NOT NULL;").fetchall()
+    connection.close()
+    sizes = {path: (width, height) for path, width, height, _ in rows}
+    index = similarity.build_index(((path, dhash) for path, _, _, dhash in rows), radius)
+
+    if image_path is not None:
+        with Image.open(image_path) as img:
+            img.draft("RGB", (img.width // 8, img.height // 8))
+            dhash = similarity.get_dhash(img)
+        for distance, path in index.search(dhash):
+            width, height = sizes[path]
+            print(f"{distance:>3} {width}x{height} {path}")
+        return
+
+    for cluster in index.get_clusters():
+        if len(cluster) < 2:
+            continue
+        cluster.sort(key=lambda path: sizes[path][0] * sizes[path][1], reverse=True)
+        print("\n".join(f"{sizes[path][0]}x{sizes[path][1]} {path}" for path in cluster), end="\n\n")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src", description="Wallpaper scan/copy/enlarge without GUI")
+    parser.add_argument("--settings", default="./settings.json", help="settings file shared with the GUI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    scan_parser = subparsers.add_parser("scan", help="scan folder and store edge deviations to the db")
+    scan_parser.add_argument("--rescore", action="store_true", help="recompute deviations from stored edges")
+    copy_parser = subparsers.add_parser("copy", help="copy images matching filters from the db")
+    copy_parser.add_argument("--dry-run", action="store_true", help="report what a sync would copy and remove, change nothing")
+    copy_parser.add_argument("--remove-stale", action="store_true", help="remove earlier copies which do not match anymore")
+    subparsers.add_parser("enlarge", help="enlarge images to wallpaper aspect ratio")
+    watch_parser = subparsers.add_parser("watch", help="scan new files in scan folder until interrupted")
+    watch_parser.add_argument("--copy", action="store_true", help="copy new files matching copier filters")
+    watch_parser.add_argument("--polling", action="store_true", help="poll the folder instead of filesystem events")
+    similar_parser = subparsers.add_parser("similar", help="list near-duplicates of an image or all groups of them")
+    similar_parser.add_argument("image", nargs="?")
+    similar_parser.add_argument("--radius", type=int, help="maximum Hamming distance of perceptual hashes")
+    args = parser.parse_args(argv)
+
+    settings = read_json_file(args.settings)
+    if args.command == "similar":
+        show_similar(settings, args.image, args.radius if args.radius is not None else settings.get("similarity_radius", 6))
+        return 0
+    if args.command == "scan" and args.rescore:
+        settings["scan_mode"] = "rescore"
+    if args.command == "copy":
+        settings["copy_dry_run"] = args.dry_run
+        settings["copy_remove_stale"] = settings.get("copy_remove_stale", False) or args.remove_stale
+    if args.command == "watch":
+        settings["watch_auto_copy"] = settings.get("watch_auto_copy", False) or args.copy
+        if args.polling:
+            settings["watch_backend"] = "polling"
+
+    engine = create_engine(args.command)
+    reporter = ConsoleReporter(args.command)
+    engine.message_signal.connect(reporter.on_message)
+    engine.progress_signal.connect(reporter.on_progress)
+
+    engine.settings = settings
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        reporter.finish()
+        return 130
+    reporter.finish()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,53 +1,274 @@
+import json
 import os
-import shutil
 import sqlite3
 from typing import Any
 
-# pylint: disable=no-name-in-module, attribute-defined-outside-init
-from PyQt6.QtCore import QObject, pyqtSignal
+from ..utils.logger import get_logger
+from ..utils.progress import ProgressSnapshot, ProgressTracker
+from ..utils.signal import Signal
+from .manifest import CopyManifest
+from .transfer import TransferPool
 
+# pylint: disable=attribute-defined-outside-init
 
-class Copier(QObject):
-    initialized_signal = pyqtSignal(int)
-    message_signal = pyqtSignal(str)
-    image_checked_signal = pyqtSignal(int)
+_logger = get_logger(__file__)
+
+
+def get_ratio_range(sides_ratio: str, whratio_deviation: str) -> tuple[float, float]:
+    """
+    Args:
+        sides_ratio (str): wanted width to height ratio, for example "16x9"
+        whratio_deviation (str): allowed deviation from it, for example "10%"
+
+    Returns:
+        tuple[float, float]: exclusive minimum and maximum width / height
+    """
+    w = int(sides_ratio.split("x")[0].strip())
+    h = int(sides_ratio.split("x")[1].strip())
+    whratio = w / h
+    deviation = int(whratio_deviation.split("%")[0])/100
+    minimum_ratio = whratio*(1 - deviation)
+    maximum_ratio = whratio*(1 + deviation)
+    return minimum_ratio, maximum_ratio
+
+
+class Copier:
+    default_settings: dict[str, Any] = {
+        "minimum_width": 0,
+        "minimum_height": 0,
+        # pictures with both edges deviating less than this are copied
+        "maximum_deviation": 2,
+        # pictures of this aspect ratio are copied whatever their edges are
+        "sides_ratio": "16x9",
+        "whratio_deviation": "10%",
+        # copy only the biggest picture of every group of near-duplicates
+        "copy_best_of_similar": False,
+        # maximum Hamming distance between perceptual hashes of near-duplicates
+        "similarity_radius": 6,
+        # one of transfer.TRANSFER_MODES
+        "copy_mode": "copy",
+        "copy_threads": 4,
+        # skip pictures copied by earlier runs with the same settings, see manifest.py
+        "copy_sync": True,
+        # remove earlier copies which do not match the settings anymore, only in sync mode
+        "copy_remove_stale": False,
+        # report what a sync run would copy and remove, change nothing
+        "copy_dry_run": False,
+        "progress_interval": 0.2,
+        "progress_log_interval": 5.0
+    }
 
     def __init__(self):
-        super().__init__()
+        self.initialized_signal = Signal()
+        self.message_signal = Signal()
+        self.image_checked_signal = Signal()
+        self.progress_signal = Signal()
+
         self.settings: dict[str, Any] = {}
+        self.transfers: TransferPool | None = None
+        self.manifest: CopyManifest | None = None
+        self.progress = ProgressTracker(logger=_logger)
+        self.progress.updated_signal.connect(self.on_progress)
 
-    def run(self):
-        self.images_checked = 0
-        w = int(self.settings["sides_ratio"].split("x")[0].strip())
-        h = int(self.settings["sides_ratio"].split("x")[1].strip())
-        whratio = w / h
-        whratio_deviation = int(self.settings["whratio_deviation"].split("%")[0])/100
-        minimum_ratio = whratio*(1 - (whratio_deviation))
-        maximum_ratio = whratio*(whratio_deviation)
-
-        self.connection = sqlite3.connect(f"./{self.settings['copier_db_name']}.db", check_same_thread=False)
+    def on_progress(self, snapshot: ProgressSnapshot):
+        self.image_checked_signal.emit(snapshot.done)
+        self.progress_signal.emit(snapshot)
+
+    def prepare_settings(self):
+        self.settings = self.default_settings | self.settings
+
+    def get_ratio_range(self) -> tuple[float, float]:
+        return get_ratio_range(self.settings["sides_ratio"], self.settings["whratio_deviation"])
+
+    def get_filter(self) -> tuple[str, tuple[Any, ...]]:
+        """
+        Builds SQL condition selecting pictures which match the copier settings: big enough and either
+        with plain edges or already of the wanted aspect ratio
+
+        Returns:
+            tuple[str, tuple[Any, ...]]: condition over pictures columns and its parameters
+        """
+        minimum_ratio, maximum_ratio = self.get_ratio_range()
+        # A dry run does not fill whratio of older scans, it is computed for every row instead
+        whratio = "CAST(width AS REAL) / height" if self.settings["copy_dry_run"] else "whratio"
+        condition = f"""
+            width > ? AND height > ? AND (
+                (left_deviation < ? AND right_deviation < ?) OR
+                ({whratio} > ? AND {whratio} < ?)
+            )
+        """
+        parameters = (
+            self.settings["minimum_width"], self.settings["minimum_height"],
+            self.settings["maximum_deviation"], self.settings["maximum_deviation"],
+            minimum_ratio, maximum_ratio
+        )
+        return condition, parameters
+
+    def prepare_db(self):
+        """
+        Adds the stored aspect ratio to dbs scanned before it existed and creates indexes used by the filter
+        """
+        self.cursor.execute("PRAGMA table_info(pictures);")
+        if "whratio" not in {column[1] for column in self.cursor.fetchall()}:
+            self.cursor.execute("ALTER TABLE pictures ADD COLUMN whratio REAL;")
+        # Either side of the OR in get_filter is searched in its own index,
+        # width and height are included so the candidates are counted without reading the table
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS pictures_deviations ON pictures(left_deviation, right_deviation, width, height);"
+        )
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS pictures_whratio ON pictures(whratio, width, height);")
+        # Found through the index, so only rows of older scans are touched
+        self.cursor.execute("UPDATE pictures SET whratio = CAST(width AS REAL) / height WHERE whratio IS NULL AND height > 0;")
+        self.connection.commit()
+
+    def open_db(self):
+        db_path = f"./{self.settings['copier_db_name']}.db"
+        if self.settings["copy_dry_run"]:
+            # A dry run changes nothing, not even the schema. mode=ro does not create a missing db
+            self.connection = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, check_same_thread=False)
+            self.cursor = self.connection.cursor()
+            return
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
         self.cursor = self.connection.cursor()
+        self.prepare_db()
+        CopyManifest.create_table(self.connection)
+
+    def load_manifest(self):
+        """
+        Loads copies made by earlier runs in sync mode, a dry run plans a sync run too
+        """
+        self.manifest = None
+        if not (self.settings["copy_sync"] or self.settings["copy_dry_run"]):
+            return
+        parameters = json.dumps({
+            key: self.settings[key] for key in (
+                "minimum_width", "minimum_height", "maximum_deviation", "sides_ratio", "whratio_deviation",
+                "copy_best_of_similar", "copy_mode"
+            )
+        }, sort_keys=True)
+        self.manifest = CopyManifest(self.connection, self.settings["result_copy_folder"], parameters)
+        self.manifest.load()
+
+    def on_file_transferred(self, _: str, destination: str, size: int):
+        self.progress.add(0, size)
+        if self.manifest is not None:
+            self.manifest.record(destination, size)
+
+    def on_transfer_error(self, path: str, error: OSError):
+        self.message_signal.emit(f"Could not copy file {path}: {error}\n")
+
+    def start_transfers(self):
+        self.transfers = TransferPool(
+            self.settings["copy_mode"],
+            self.settings["copy_threads"],
+            self.on_file_transferred,
+            self.on_transfer_error
+        )
+
+    def finish_transfers(self):
+        """
+        Waits for queued copies, stores them in the manifest and reports throughput of every transfer mode
+        """
+        self.transfers.close()
+        stats = self.transfers.format_stats()
+        self.transfers = None
+        if self.manifest is not None:
+            self.manifest.flush()
+        if stats:
+            _logger.info("Transfers:\n%s", stats)
+            self.message_signal.emit(f"{stats}\n")
+
+    def copy_picture(self, md5: str, path: str):
+        """
+        Queues a copy of a file to result_copy_folder, start_transfers has to be called first.
+        In sync mode pictures copied by earlier runs are skipped. Copied bytes are added to progress when the copy is done.
+
+        Args:
+            md5 (str): hash of the picture
+            path (str): file to copy
+        """
+        if self.manifest is None:
+            destination = os.path.join(self.settings["result_copy_folder"], os.path.basename(path))
+        else:
+            destination = self.manifest.add(md5, path)
+            if destination is None:
+                return
+        if self.transfers is not None:
+            self.transfers.submit(path, destination)
+
+    def finish_sync(self):
+        """
+        Reports the plan of a sync run and removes copies which do not match the settings anymore
+        """
+        self.manifest.plan_stale()
+        dry_run = self.settings["copy_dry_run"]
+        self.message_signal.emit(f"{'Dry run' if dry_run else 'Sync'}: {self.manifest.plan.format()}\n")
+        if dry_run or not self.settings["copy_remove_stale"]:
+            return
+        for destination in self.manifest.remove_stale():
+            self.message_signal.emit(f"Could not remove file {destination}\n")
+        self.manifest.flush()
+
+    def run(self):
+        self.prepare_settings()
+        self.progress.interval = self.settings["progress_interval"]
+        self.progress.log_interval = self.settings["progress_log_interval"]
+
+        dry_run = self.settings["copy_dry_run"]
+        if not dry_run:
+            os.makedirs(self.settings["result_copy_folder"], exist_ok=True)
+        self.open_db()
+        self.load_manifest()
+        condition, parameters = self.get_filter()
+
+        self.cursor.execute(f"SELECT COUNT(*) FROM pictures WHERE {condition};", parameters)
+        images_amount = self.cursor.fetchone()[0]
+        self.progress.start(images_amount)
+        self.initialized_signal.emit(images_amount)
+
+        best_of_similar = self.settings["copy_best_of_similar"]
+        self.cursor.execute(
+            f"SELECT md5, path, width, height, {'dhash' if best_of_similar else 'NULL'} FROM pictures WHERE {condition};",
+            parameters
+        )
+        # Matching pictures with perceptual hashes are copied after clustering
+        similar_candidates: list[tuple[str, str, int, int]] = []
+        if not dry_run:
+            self.start_transfers()
+        try:
+            # Rows are streamed from the cursor, the table is never loaded as a whole
+            for md5, path, width, height, dhash in self.cursor:
+                if dhash is not None:
+                    similar_candidates.append((md5, path, width * height, dhash))
+                else:
+                    self.copy_picture(md5, path)
+                self.progress.add(1)
+
+            if similar_candidates:
+                self.copy_best_of_similar(similar_candidates)
+        finally:
+            if self.transfers is not None:
+                self.finish_transfers()
+        if self.manifest is not None:
+            self.finish_sync()
+        self.progress.finish()
+
+    def copy_best_of_similar(self, candidates: list[tuple[str, str, int, int]]):
+        """
+        Copies only the biggest picture of every group of near-duplicates
+
+        Args:
+            candidates (list[tuple[str, str, int, int]]): (md5, path, width * height, dhash) of matching pictures
+        """
+        # numpy is loaded only when near-duplicates are looked for
+        from . import similarity # pylint: disable=import-outside-toplevel
 
-        self.cursor.execute("SELECT COUNT(md5) FROM pictures;")
-        self.initialized_signal.emit(self.cursor.fetchone()[0])
-
-        self.cursor.execute("SELECT path, width, height, left_deviation, right_deviation FROM pictures;")
-        for path, width, height, left_deviation, right_deviation in self.cursor.fetchall():
-            image_whratio = width / height
-            if (
-                width > self.settings["minimum_width"] and
-                height > self.settings["minimum_height"] and
-                (
-                    (
-                        left_deviation < self.settings["maximum_deviation"] and
-                        right_deviation < self.settings["maximum_deviation"]
-                    ) or
-                    minimum_ratio < image_whratio < maximum_ratio
-                )
-            ):
-                if not os.path.exists(path):
-                    self.message_signal.emit(f"Could not find file {path}\n")
-                    continue
-                shutil.copy(path, f"{self.settings['result_copy_folder']}/{os.path.split(path)[1]}")
-            self.images_checked += 1
-            self.image_checked_signal.emit(self.images_checked)
+        areas = {(md5, path): area for md5, path, area, _ in candidates}
+        clusters = similarity.get_clusters(
+            (((md5, path), dhash) for md5, path, _, dhash in candidates), self.settings["similarity_radius"]
+        )
+        for cluster in clusters:
+            md5, best = max(cluster, key=areas.__getitem__)
+            if len(cluster) > 1:
+                self.message_signal.emit(f"Copying {best}, skipped {len(cluster) - 1} similar pictures\n")
+            self.copy_picture(md5, best)
@@ -0,0 +1,108 @@
+import sqlite3
+import time
+from collections.abc import Callable
+from queue import Empty, Queue
+from threading import Thread
+
+# (sql, values) pairs produced by one processed item, empty list if nothing has to be written
+Statements = list[tuple[str, tuple]]
+
+_STOP = None
+
+
+class ResultWriter(Thread):
+    """
+    The only thread writing scan results to the db. Items are flushed with executemany
+    in one transaction when batch_size items are collected or flush_interval seconds pass,
+    so a crash loses at most one batch.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        on_commit: Callable[[int], None],
+        batch_size: int = 256,
+        flush_interval: float = 1.0
+    ):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.on_commit = on_commit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.error: Exception | None = None
+        # Seconds spent in every commit, includes waiting for other db connections
+        self.flush_durations: list[float] = []
+        self._queue: Queue[Statements | None] = Queue()
+
+    def put(self, statements: Statements):
+        """
+        Adds results of one processed item, on_commit is called for it after its batch is committed
+
+        Args:
+            statements (Statements): (sql, values) pairs to execute
+        """
+        self._queue.put(statements)
+
+    def close(self):
+        """
+        Flushes everything left and waits for the writer to stop
+
+        Raises:
+            Exception: error which stopped the writer
+        """
+        self._queue.put(_STOP)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("PRAGMA journal_mode=WAL;")
+        # FULL syncs the WAL on every commit, so committed batches survive power loss and OS crashes too.
+        # Commits are batched, one fsync per batch costs little next to decoding
+        connection.execute("PRAGMA synchronous=FULL;")
+        connection.execute("PRAGMA temp_store=MEMORY;")
+        connection.execute("PRAGMA cache_size=-65536;")
+        return connection
+
+    def _flush(self, connection: sqlite3.Connection, pending: list[Statements]):
+        grouped: dict[str, list[tuple]] = {}
+        for statements in pending:
+            for sql, values in statements:
+                grouped.setdefault(sql, []).append(values)
+
+        start = time.perf_counter()
+        with connection:
+            for sql, rows in grouped.items():
+                connection.executemany(sql, rows)
+        self.flush_durations.append(time.perf_counter() - start)
+
+        self.on_commit(len(pending))
+
+    def run(self):
+        connection = self._connect()
+        pending: list[Statements] = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                try:
+                    statements = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except Empty:
+                    statements = []
+                else:
+                    if statements is _STOP:
+                        break
+                    pending.append(statements)
+
+                if len(pending) >= self.batch_size or time.monotonic() >= deadline:
+                    if pending:
+                        self._flush(connection, pending)
+                        pending = []
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending:
+                self._flush(connection, pending)
+        except Exception as e: # pylint: disable=broad-except
+            self.error = e
+        finally:
+            connection.close()
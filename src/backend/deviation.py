@@ -0,0 +1,340 @@
+import os
+from collections.abc import Callable
+from threading import Lock
+
+import numpy as np
+# pylint: disable=no-name-in-module
+from colormath import color_constants, color_diff_matrix
+from colormath.color_objects import sRGBColor
+from PIL import Image
+
+# Vectorized counterpart of the colormath pipeline used by Scaner:
+# convert_color(sRGBColor(r, g, b, is_upscaled=True), LabColor) followed by a delta_e_* call.
+# The constants are taken from colormath itself and the delta E formulas are colormath's own
+# matrix implementations, so results match the scalar path up to float rounding
+# (observed difference is below 1e-9, guaranteed tolerance is DELTA_E_TOLERANCE).
+DELTA_E_TOLERANCE = 1e-6
+# Lab tables are stored as float32, with an 8 bit table results match colormath within this tolerance
+LAB_TABLE_TOLERANCE = 1e-4
+
+_RGB_TO_XYZ = np.array(sRGBColor.conversion_matrices["rgb_to_xyz"], dtype=np.float64)
+_ILLUMINANT_XYZ = np.array(color_constants.ILLUMINANTS["2"][sRGBColor.native_illuminant], dtype=np.float64)
+
+DeltaEFunction = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+_lab_tables: dict[str, np.ndarray] = {}
+_lab_tables_lock = Lock()
+
+
+def get_delta_e_function(index: int) -> DeltaEFunction:
+    """
+    Gets vectorized delta E function by the same index as Scaner.get_color_algorithm
+
+    Args:
+        index (int): 0 - CIE76, 1 - CMC l:c, 2 - CIE94, 3 - CIEDE2000
+
+    Returns:
+        DeltaEFunction: function taking Lab vector of shape (3,) and Lab matrix of shape (n, 3)
+    """
+    algorithms = {
+        0: color_diff_matrix.delta_e_cie1976,
+        1: color_diff_matrix.delta_e_cmc,
+        2: color_diff_matrix.delta_e_cie1994,
+        3: color_diff_matrix.delta_e_cie2000
+    }
+    return algorithms[index]
+
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    Converts upscaled (0-255) sRGB colors to Lab (observer 2, illuminant d65)
+
+    Args:
+        rgb (np.ndarray): array of shape (..., 3) or more channels, extra channels are ignored
+
+    Returns:
+        np.ndarray: float64 array of shape (..., 3) with L, a, b channels
+    """
+    channels = np.asarray(rgb)[..., :3] / 255.0
+    linear = np.where(channels <= 0.04045, channels / 12.92, np.power((channels + 0.055) / 1.055, 2.4))
+
+    xyz = np.maximum(linear @ _RGB_TO_XYZ.T, 0.0) / _ILLUMINANT_XYZ
+    xyz = np.where(xyz > color_constants.CIE_E, np.power(xyz, 1.0 / 3.0), (7.787 * xyz) + (16.0 / 116.0))
+
+    lab = np.empty(xyz.shape, dtype=np.float64)
+    lab[..., 0] = (116.0 * xyz[..., 1]) - 16.0
+    lab[..., 1] = 500.0 * (xyz[..., 0] - xyz[..., 1])
+    lab[..., 2] = 200.0 * (xyz[..., 1] - xyz[..., 2])
+    return lab
+
+
+def _build_lab_table(path: str, bits: int):
+    levels = 2 ** bits
+    step = 256 // levels
+    # Every cell is represented by its center color
+    values = np.arange(levels, dtype=np.float64) * step + (step - 1) / 2
+    green, blue = np.meshgrid(values, values, indexing="ij")
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    table = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.float32, shape=(levels ** 3, 3))
+    for red_index, red in enumerate(values):
+        rgb = np.stack((np.full(green.shape, red), green, blue), axis=-1).reshape(-1, 3)
+        table[red_index * levels ** 2:(red_index + 1) * levels ** 2] = srgb_to_lab(rgb)
+    table.flush()
+    del table
+    os.replace(temp_path, path)
+
+
+def get_lab_table(bits: int = 8, folder: str = "./cache") -> np.ndarray:
+    """
+    Gets precomputed sRGB to Lab table, it is built once, saved to folder and then memory mapped read-only,
+    so all threads and processes share the same pages
+
+    Args:
+        bits (int, optional): bits per channel, 8 - every 24 bit color (~200 MB),
+            less - colors are quantized (6 bits - ~3 MB). Defaults to 8.
+        folder (str, optional): folder to store the table in. Defaults to "./cache".
+
+    Returns:
+        np.ndarray: float32 array of shape (2 ** (bits * 3), 3), see get_table_indices
+    """
+    path = os.path.join(folder, f"srgb_lab_{bits}.npy")
+    with _lab_tables_lock:
+        if path not in _lab_tables:
+            if not os.path.exists(path):
+                os.makedirs(folder, exist_ok=True)
+                _build_lab_table(path, bits)
+            _lab_tables[path] = np.load(path, mmap_mode="r")
+        return _lab_tables[path]
+
+
+def get_table_indices(rgb: np.ndarray, lab_table: np.ndarray) -> np.ndarray:
+    """
+    Gets indices of colors in a table from get_lab_table
+
+    Args:
+        rgb (np.ndarray): upscaled colors of shape (..., 3) or more channels, extra channels are ignored
+        lab_table (np.ndarray): table from get_lab_table
+
+    Returns:
+        np.ndarray: indices of shape (...)
+    """
+    bits = (len(lab_table).bit_length() - 1) // 3
+    channels = np.asarray(rgb)[..., :3].astype(np.int64) >> (8 - bits)
+    return (channels[..., 0] << (2 * bits)) | (channels[..., 1] << bits) | channels[..., 2]
+
+
+def pixels_to_lab(rgb: np.ndarray, lab_table: np.ndarray | None = None) -> np.ndarray:
+    """
+    Converts upscaled sRGB colors to Lab, through lab_table lookup if it is given
+
+    Args:
+        rgb (np.ndarray): colors of shape (..., 3) or more channels, extra channels are ignored
+        lab_table (np.ndarray | None, optional): table from get_lab_table. Defaults to None.
+
+    Returns:
+        np.ndarray: float64 array of shape (..., 3)
+    """
+    if lab_table is None:
+        return srgb_to_lab(rgb)
+    return lab_table[get_table_indices(rgb, lab_table)].astype(np.float64)
+
+
+def get_strip_pixels(strip: Image.Image) -> np.ndarray:
+    """
+    Gets pixels of a 1 pixel wide image strip
+
+    Args:
+        strip (Image.Image): strip from Scaner.get_edge_strips
+
+    Returns:
+        np.ndarray: pixels of shape (height, bands)
+    """
+    return np.asarray(strip).reshape(strip.height, -1)
+
+
+def pack_colors(rgb: np.ndarray) -> np.ndarray:
+    """
+    Packs colors into 24 bit integers
+
+    Args:
+        rgb (np.ndarray): colors of shape (..., 3) or more channels, extra channels are ignored
+
+    Returns:
+        np.ndarray: int64 array of shape (...)
+    """
+    channels = np.asarray(rgb)[..., :3].astype(np.int64)
+    return (channels[..., 0] << 16) | (channels[..., 1] << 8) | channels[..., 2]
+
+
+def get_mode_color(colors: np.ndarray, tolerance_bits: int = 0) -> np.ndarray:
+    """
+    Gets the most common color, multiple modes are averaged like statistics.multimode results were
+
+    Args:
+        colors (np.ndarray): pixels of shape (n, bands), only first 3 bands are used
+        tolerance_bits (int, optional): lowest bits of every channel ignored when counting,
+            so near-identical colors (JPEG noise) are counted together and the mode is the
+            average color of its bin. Defaults to 0.
+
+    Returns:
+        np.ndarray: int64 RGB vector of shape (3,)
+    """
+    rgb = np.asarray(colors)[:, :3].astype(np.int64)
+    bins, inverse, counts = np.unique(pack_colors(rgb >> tolerance_bits), return_inverse=True, return_counts=True)
+    modes = np.flatnonzero(counts == counts.max())
+
+    if tolerance_bits == 0:
+        mode_colors = np.stack(((bins[modes] >> 16) & 255, (bins[modes] >> 8) & 255, bins[modes] & 255), axis=-1)
+    else:
+        inverse = inverse.reshape(-1)
+        sums = np.stack([np.bincount(inverse, weights=rgb[:, channel], minlength=len(bins)) for channel in range(3)], axis=-1)
+        mode_colors = sums[modes].astype(np.int64) // counts[modes, np.newaxis]
+
+    return mode_colors.sum(axis=0) // len(mode_colors)
+
+
+def get_prevailing_color(
+    colors: np.ndarray, lab_table: np.ndarray | None = None, tolerance_bits: int = 0
+) -> np.ndarray:
+    """
+    Gets Lab of the most common color
+
+    Args:
+        colors (np.ndarray): pixels of shape (n, bands)
+        lab_table (np.ndarray | None, optional): table from get_lab_table. Defaults to None.
+        tolerance_bits (int, optional): see get_mode_color. Defaults to 0.
+
+    Returns:
+        np.ndarray: Lab vector of shape (3,)
+    """
+    return pixels_to_lab(get_mode_color(colors, tolerance_bits), lab_table)
+
+
+def get_column_deviation(
+    column: np.ndarray,
+    pixel_scan_frequency: int,
+    delta_e: DeltaEFunction,
+    lab_table: np.ndarray | None = None,
+    tolerance_bits: int = 0
+) -> float:
+    """
+    Gets average deviation of a column from its prevailing color
+
+    Args:
+        column (np.ndarray): pixels of shape (height, bands)
+        pixel_scan_frequency (int): scan every n-th pixel
+        delta_e (DeltaEFunction): function from get_delta_e_function
+        lab_table (np.ndarray | None, optional): table from get_lab_table. Defaults to None.
+        tolerance_bits (int, optional): see get_mode_color. Defaults to 0.
+
+    Returns:
+        float: deviation normalized the same way as Scaner.get_vertical_line_deviation
+    """
+    height = len(column)
+    sampled = column[:height-1:pixel_scan_frequency]
+    if len(sampled) == 0:
+        return 0.0
+
+    mode_lab_color = get_prevailing_color(sampled, lab_table, tolerance_bits)
+    deviation = delta_e(mode_lab_color, pixels_to_lab(sampled, lab_table)).sum()
+
+    return float(deviation/(height/pixel_scan_frequency))
+
+
+def _get_jittered_positions(total: int, block: int, rng: np.random.Generator) -> np.ndarray:
+    # One random pixel in every block, periodic edges can not line up with the samples
+    starts = np.arange(0, total, block)
+    return starts + (rng.random(len(starts)) * np.minimum(block, total - starts)).astype(np.int64)
+
+
+def _refine_positions(positions: np.ndarray, block: int, total: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Halves the blocks of a level: every block already has one sampled pixel, a random pixel of its other half is added
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: added positions and one position in every block of the halved size
+    """
+    half = block // 2
+    starts = np.arange(len(positions)) * block
+    other_starts = np.where(positions - starts < half, starts + half, starts)
+    exists = other_starts < total
+    other_starts = other_starts[exists]
+    added = other_starts + (rng.random(len(other_starts)) * np.minimum(half, total - other_starts)).astype(np.int64)
+
+    refined = np.empty(-(-total // half), dtype=np.int64)
+    refined[positions // half] = positions
+    refined[added // half] = added
+    return added, refined
+
+
+def get_column_deviation_adaptive(
+    column: np.ndarray,
+    pixel_scan_frequency: int,
+    delta_e: DeltaEFunction,
+    threshold: float,
+    confidence_z: float = 3.0,
+    min_samples: int = 32,
+    lab_table: np.ndarray | None = None,
+    tolerance_bits: int = 0
+) -> tuple[float, bool]:
+    """
+    Gets deviation like get_column_deviation, but samples progressively: a random pixel of every block of 2^k pixels
+    first, then a random pixel of the other half of every block, and stops as soon as the deviation is confidently
+    above or below threshold. Without an early exit every pixel is sampled once, so the result is the full scan.
+
+    Args:
+        column (np.ndarray): pixels of shape (height, bands)
+        pixel_scan_frequency (int): scan every n-th pixel at the finest level
+        delta_e (DeltaEFunction): function from get_delta_e_function
+        threshold (float): deviation the decision is made about, usually maximum deviation of the copier
+        confidence_z (float, optional): width of confidence interval in standard errors. Defaults to 3.0.
+        min_samples (int, optional): amount of pixels at the coarsest level. Defaults to 32.
+        lab_table (np.ndarray | None, optional): table from get_lab_table. Defaults to None.
+        tolerance_bits (int, optional): see get_mode_color. Defaults to 0.
+
+    Returns:
+        tuple[float, bool]: deviation (estimated if exited early) and whether it exited early
+    """
+    height = len(column)
+    sampled = column[:height-1:pixel_scan_frequency]
+    total = len(sampled)
+    if total == 0:
+        return 0.0, False
+
+    mode_lab_color = get_prevailing_color(sampled, lab_table, tolerance_bits)
+    # Full scan divides the sum by height/pixel_scan_frequency instead of amount of pixels
+    normalization = total / (height / pixel_scan_frequency)
+
+    block = 1
+    while total // (block * 2) >= min_samples:
+        block *= 2
+
+    # Seeded by the column, the same picture always gets the same deviation
+    rng = np.random.default_rng(total)
+    positions = _get_jittered_positions(total, block, rng)
+    indices = positions
+    deltas_sum = 0.0
+    deltas_squares_sum = 0.0
+    count = 0
+    while True:
+        if len(indices):
+            deltas = delta_e(mode_lab_color, pixels_to_lab(sampled[indices], lab_table))
+            deltas_sum += float(deltas.sum())
+            deltas_squares_sum += float(np.square(deltas).sum())
+            count += len(deltas)
+
+        mean = deltas_sum / count
+        if block == 1:
+            return mean * normalization, False
+
+        # The coarsest level alone is never trusted, a pattern with the period of its blocks may still fool it
+        if indices is not positions:
+            variance = max(deltas_squares_sum / count - mean ** 2, 0.0) * count / max(count - 1, 1)
+            # Finite population correction, the column has only total pixels
+            standard_error = np.sqrt(variance / count * (total - count) / max(total - 1, 1))
+            if abs(mean - threshold / normalization) > confidence_z * standard_error:
+                return mean * normalization, True
+
+        indices, positions = _refine_positions(positions, block, total, rng)
+        block //= 2
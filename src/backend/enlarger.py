@@ -1,51 +1,211 @@
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any
+
+from PIL import Image, UnidentifiedImageError
+
+from ..utils.logger import get_logger
+from ..utils.progress import ProgressSnapshot, ProgressTracker
+from ..utils.signal import Signal
+
+# pylint: disable=attribute-defined-outside-init
+
+_logger = get_logger(__file__)
+
+ENLARGED_FORMATS = ("PNG", "JPEG", "BMP")
+
+# Results of enlarge_file
+ENLARGED = "enlarged"
+SMALL = "small"
+WIDE = "wide"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def get_aspect_ratio(sides_ratio: str) -> float:
+    """
+    Args:
+        sides_ratio (str): width to height ratio, for example "16x9"
+
+    Raises:
+        ValueError: sides_ratio is not two positive numbers separated by "x"
+
+    Returns:
+        float: width / height
+    """
+    w, h = (float(side.strip()) for side in sides_ratio.split("x"))
+    if w <= 0 or h <= 0:
+        raise ValueError(f"Sides ratio has to be positive, got {sides_ratio}")
+    return w / h
+
+
+def pad_sides(image: Image.Image, width: int) -> Image.Image:
+    """
+    Widens an image to width by repeating its first column on the left and its last column on the right
+
+    Args:
+        image (Image.Image): image to widen
+        width (int): width of the result, not less than the width of image
+
+    Returns:
+        Image.Image: image of the same mode and palette with the original in the middle
+    """
+    left = (width - image.width) // 2
+    right = width - image.width - left
+    # Cropping outside of the image keeps its mode and palette and leaves room for both sides
+    enlarged = image.crop((-left, 0, image.width + right, image.height))
+    # Every side is one nearest neighbour stretch of an edge column
+    if left > 0:
+        left_strip = image.crop((0, 0, 1, image.height)).resize((left, image.height), Image.Resampling.NEAREST)
+        enlarged.paste(left_strip, (0, 0))
+    if right > 0:
+        right_strip = image.crop((image.width - 1, 0, image.width, image.height)).resize((right, image.height), Image.Resampling.NEAREST)
+        enlarged.paste(right_strip, (left + image.width, 0))
+    return enlarged
+
+
+def enlarge_file(
+    path: str, result_folder: str, small_folder: str, min_height: int, aspect_ratio: float
+) -> tuple[str, str, int, str]:
+    """
+    Enlarges one picture to the aspect ratio, pictures lower than min_height are copied to small_folder instead
+
+    Args:
+        path (str): picture to enlarge
+        result_folder (str): folder for enlarged pictures
+        small_folder (str): folder for pictures lower than min_height
+        min_height (int): minimum height of enlarged pictures
+        aspect_ratio (float): width / height of enlarged pictures
+
+    Returns:
+        tuple[str, str, int, str]: ENLARGED, SMALL, WIDE, SKIPPED or FAILED, path, file size in bytes
+            and the error of a FAILED file, empty otherwise
+    """
+    name = os.path.basename(path)
+    size = 0
+    try:
+        size = os.path.getsize(path)
+        with Image.open(path) as image:
+            if image.format not in ENLARGED_FORMATS:
+                return SKIPPED, path, size, ""
+            if image.height < min_height:
+                shutil.copy2(path, os.path.join(small_folder, name))
+                return SMALL, path, size, ""
+            width = round(image.height * aspect_ratio)
+            if width <= image.width:
+                return WIDE, path, size, ""
+
+            enlarged = pad_sides(image, width)
+            save_parameters = {"format": image.format}
+            if "transparency" in image.info:
+                save_parameters["transparency"] = image.info["transparency"]
+            enlarged.save(os.path.join(result_folder, name), **save_parameters)
+    except UnidentifiedImageError:
+        # Not a picture
+        return SKIPPED, path, size, ""
+    except OSError as e:
+        # Exceptions are returned as text, the parent process reports them
+        return FAILED, path, size, str(e)
+    except Exception as e: # pylint: disable=broad-except
+        # Image.DecompressionBombError for example, one file must not stop the whole run
+        _logger.exception("Could not enlarge file %s", path)
+        return FAILED, path, size, repr(e)
+    return ENLARGED, path, size, ""
+
+
 class EnlargeImages:
+    """
+    Widens pictures to the wallpaper aspect ratio by repeating their edge columns, on a pool of processes
+    """
     # TODO: Изменение расширения с копирования 1 и n-1 строчек на цвет этих строчек, чтобы избежать полос + отдельно для градиента
     # TODO: В случае наклона градиента - попытка продолжения наклона
-    class StartThread(Thread):
-        def __init__(self, name: str, q: queue.Queue, queue_start_size: int, min_height: int = 1000):
-            super().__init__()
-            self.thread_name = name
-            self.pics_queue = q
-            self.pics_queueueue_start_size = queue_start_size
-            self.min_height = min_height
-            self.end_folder = r"E:\Эротические фотокарточки\На обои (по цветам краев)\Увеличенные"
-            self.height_folder = r"E:\Эротические фотокарточки\На обои (по цветам краев)\Малый размер"
-
-        def run(self):
-            for file in self.pics_queue:
-                if imghdr.what(rf"E:\Эротические фотокарточки\На обои (по цветам краев)\{file}") in ("png", "jpeg", "bmp"):
-                    img = Image.open(f"E:\\Эротические фотокарточки\\На обои (по цветам краев)\\{file}")
-                    if img.height < self.min_height:
-                        img.save(f"{self.height_folder}\\{file}")
-                        continue
-                    left_strip = img.crop((0, 0, 1, img.height))
-                    right_strip = img.crop((img.width-1, 0, img.width, img.height))
-
-                    enl_im = Image.new(img.mode, (int(img.height*1.77), img.height))
-                    enl_im.paste(img, (int(enl_im.width/2-img.width/2), 0))
-                    for width in range(int(enl_im.width/2 - img.width/2) + 3):
-                        enl_im.paste(left_strip, (width, 0))
-                        enl_im.paste(right_strip, (enl_im.width-width, 0))
-                    enl_im.save("{self.end_folder}\\{file}")
-
-                    print(f"{self.thread_name} ENLARGED {file}")
+
+    default_settings = {
+        "enlarger_source_folder": "",
+        "enlarger_result_folder": "",
+        "enlarger_small_folder": "",
+        "enlarger_min_height": 1000,
+        "enlarger_aspect_ratio": "16x9",
+        # Worker processes, decoding and encoding is not limited by GIL
+        "enlarger_processes": 24,
+        "progress_interval": 0.2,
+        "progress_log_interval": 5.0
+    }
 
     def __init__(self):
-        pass
+        self.initialized_signal = Signal()
+        self.message_signal = Signal()
+        self.image_enlarged_signal = Signal()
+        self.progress_signal = Signal()
+
+        self.settings: dict[str, Any] = {}
+        self.progress = ProgressTracker(logger=_logger)
+        self.progress.updated_signal.connect(self.on_progress)
+
+    def on_progress(self, snapshot: ProgressSnapshot):
+        self.image_enlarged_signal.emit(snapshot.done)
+        self.progress_signal.emit(snapshot)
+
+    def _put_results(self, futures: set[Future], done: set[Future], counts: dict[str, int]):
+        for future in done:
+            futures.discard(future)
+            result, path, size, error = future.result()
+            counts[result] += 1
+            if result == FAILED:
+                self.message_signal.emit(f"Could not enlarge file {path}: {error}\n")
+            self.progress.add(1, size)
+
+    def run(self):
+        self.settings = self.default_settings | self.settings
+        self.progress.interval = self.settings["progress_interval"]
+        self.progress.log_interval = self.settings["progress_log_interval"]
+        try:
+            aspect_ratio = get_aspect_ratio(self.settings["enlarger_aspect_ratio"])
+        except ValueError:
+            self.message_signal.emit(f"Wrong aspect ratio {self.settings['enlarger_aspect_ratio']}\n")
+            return
 
-    def run(self, start_folder: str, threads_amount: int = 24, copy_existing_files: bool = False):
-        pics_queue = queue.Queue()
+        source_folder = self.settings["enlarger_source_folder"]
+        result_folder = self.settings["enlarger_result_folder"]
+        small_folder = self.settings["enlarger_small_folder"]
+        if not (source_folder and result_folder and small_folder):
+            self.message_signal.emit("Source, result and small pictures folders have to be chosen\n")
+            return
+        if not os.path.isdir(source_folder):
+            self.message_signal.emit(f"Source folder {source_folder} does not exist\n")
+            return
+        try:
+            for folder in (result_folder, small_folder):
+                os.makedirs(folder, exist_ok=True)
+        except OSError as e:
+            self.message_signal.emit(f"Could not create folder: {e}\n")
+            return
 
-        for path, _, files in os.walk(start_folder):
-            for name in files:
-                fpath = os.path.join(path, name)
-                pics_queue.put(fpath)
+        paths = [
+            os.path.join(path, name)
+            for path, _, files in os.walk(source_folder)
+            for name in files
+        ]
+        self.progress.start(len(paths))
+        self.initialized_signal.emit(len(paths))
 
-        start_queue_size = pics_queue.qsize()
-        if start_queue_size < threads_amount:
-            threads_amount = start_queue_size
+        counts = dict.fromkeys((ENLARGED, SMALL, WIDE, SKIPPED, FAILED), 0)
+        processes_amount = max(1, min(self.settings["enlarger_processes"], len(paths), os.cpu_count() or 1))
+        with ProcessPoolExecutor(max_workers=processes_amount) as executor:
+            futures: set[Future] = set()
+            for path in paths:
+                # Keep only a couple of pictures per process in flight, results are reported as they come
+                if len(futures) >= processes_amount * 2:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    self._put_results(futures, done, counts)
+                futures.add(executor.submit(
+                    enlarge_file, path, result_folder, small_folder, self.settings["enlarger_min_height"], aspect_ratio
+                ))
+            self._put_results(futures, set(futures), counts)
 
-        for i in range(threads_amount):
-            thread = self.StartThread(
-                f"Thread {i}", pics_queue, start_queue_size)
-            thread.start()
+        self.progress.finish()
+        self.message_signal.emit(
+            f"Enlarged {counts[ENLARGED]} files, {counts[SMALL]} lower than {self.settings['enlarger_min_height']} px, "
+            f"{counts[WIDE]} already wide enough, {counts[SKIPPED]} skipped, {counts[FAILED]} failed\n"
+        )
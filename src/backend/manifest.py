@@ -0,0 +1,191 @@
+import os
+import sqlite3
+from dataclasses import dataclass
+from threading import Lock
+
+INSERT_COPY = "INSERT OR REPLACE INTO copies(folder, destination, md5, source, size, parameters) VALUES(?, ?, ?, ?, ?, ?);"
+DELETE_COPY = "DELETE FROM copies WHERE destination = ?;"
+
+
+@dataclass
+class SyncPlan:
+    """
+    What a sync run copies, keeps and removes
+    """
+    copy_files: int = 0
+    copy_bytes: int = 0
+    up_to_date: int = 0
+    stale_files: int = 0
+    stale_bytes: int = 0
+    # Files which got an md5 suffix because another picture already has their name
+    renamed: int = 0
+
+    def format(self) -> str:
+        return (
+            f"{self.copy_files} files to copy ({self.copy_bytes / 2**20:.1f} MB), {self.up_to_date} up to date, "
+            f"{self.stale_files} no longer matching ({self.stale_bytes / 2**20:.1f} MB), {self.renamed} renamed"
+        )
+
+
+class CopyManifest:
+    """
+    Pictures copied to one result folder by earlier runs, kept in copies table of the copier db.
+    A picture is copied again only if its copy is missing, has a different size or was made with other
+    settings (a symlink is not a copy), and every picture
+    keeps its destination name between runs. Pictures with the same file name get an md5 suffix
+    instead of overwriting each other.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, folder: str, parameters: str):
+        """
+        Args:
+            connection (sqlite3.Connection): copier db connection, used only from the thread calling flush
+            folder (str): result folder
+            parameters (str): copier settings of this run, stored next to every copy
+        """
+        self.connection = connection
+        self.folder = os.path.abspath(folder)
+        self.parameters = parameters
+        self.plan = SyncPlan()
+        # md5 to destination, size and settings of its copy
+        self.copies: dict[str, tuple[str, int, str]] = {}
+        # Destination to md5, for copies and planned copies
+        self.destinations: dict[str, str] = {}
+        # md5s matching the current settings
+        self.wanted: set[str] = set()
+        # Destination to md5 and source of copies which are not done yet
+        self._pending: dict[str, tuple[str, str]] = {}
+        self._done: list[tuple[str, str, str, int]] = []
+        self._removed: list[str] = []
+        self._lock = Lock()
+
+    @staticmethod
+    def create_table(connection: sqlite3.Connection):
+        connection.execute(
+            """
+                CREATE TABLE IF NOT EXISTS copies(
+                    folder TEXT,
+                    destination TEXT PRIMARY KEY,
+
+                    md5 TEXT,
+                    source TEXT,
+                    size INT,
+
+                    parameters TEXT
+                );
+            """
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS copies_folder ON copies(folder);")
+        connection.commit()
+
+    def load(self):
+        # A dry run does not create the table
+        if self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'copies';").fetchone() is None:
+            return
+        cursor = self.connection.execute("SELECT destination, md5, size, parameters FROM copies WHERE folder = ?;", (self.folder,))
+        for destination, md5, size, parameters in cursor:
+            self.copies[md5] = (destination, size, parameters)
+            self.destinations[destination] = md5
+
+    def _get_destination(self, md5: str, source: str) -> str:
+        name = os.path.basename(source)
+        destination = os.path.join(self.folder, name)
+        taken_by = self.destinations.get(destination)
+        # A file the manifest does not know is not overwritten either, it may belong to the user
+        if (taken_by is not None and taken_by != md5) or (taken_by is None and os.path.lexists(destination)):
+            root, extension = os.path.splitext(name)
+            destination = os.path.join(self.folder, f"{root}_{md5[:8]}{extension}")
+            self.plan.renamed += 1
+        return destination
+
+    def add(self, md5: str, source: str) -> str | None:
+        """
+        Plans a copy of a matching picture
+
+        Args:
+            md5 (str): hash of the picture
+            source (str): path of the picture
+
+        Returns:
+            str | None: destination to copy to, None if the picture is already copied
+        """
+        self.wanted.add(md5)
+        copy = self.copies.get(md5)
+        if copy is not None:
+            destination, size, parameters = copy
+            try:
+                if parameters == self.parameters and os.stat(destination).st_size == size:
+                    self.plan.up_to_date += 1
+                    return None
+            except OSError:
+                pass
+        else:
+            destination = self._get_destination(md5, source)
+            self.destinations[destination] = md5
+
+        try:
+            self.plan.copy_bytes += os.path.getsize(source)
+        except OSError:
+            # Reported when the copy fails
+            pass
+        self.plan.copy_files += 1
+        self._pending[destination] = (md5, source)
+        return destination
+
+    def record(self, destination: str, size: int):
+        """
+        Stores a finished copy, may be called from transfer threads
+        """
+        with self._lock:
+            pending = self._pending.pop(destination, None)
+            if pending is not None:
+                self._done.append((*pending, destination, size))
+
+    def get_stale(self) -> list[tuple[str, int]]:
+        """
+        Returns:
+            list[tuple[str, int]]: (destination, size) of copies which do not match the settings anymore
+        """
+        return [(destination, size) for md5, (destination, size, _) in self.copies.items() if md5 not in self.wanted]
+
+    def plan_stale(self):
+        for _, size in self.get_stale():
+            self.plan.stale_files += 1
+            self.plan.stale_bytes += size
+
+    def remove_stale(self) -> list[str]:
+        """
+        Deletes copies which do not match the settings anymore, files not in the manifest are never deleted
+
+        Returns:
+            list[str]: destinations which could not be deleted
+        """
+        failed = []
+        for destination, _ in self.get_stale():
+            try:
+                os.remove(destination)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                failed.append(destination)
+                continue
+            self._removed.append(destination)
+        return failed
+
+    def flush(self):
+        """
+        Writes finished copies and removals to the db and to the in-memory state
+        """
+        with self._lock:
+            done, self._done = self._done, []
+        removed, self._removed = self._removed, []
+        for md5, _, destination, size in done:
+            self.copies[md5] = (destination, size, self.parameters)
+        for destination in removed:
+            self.copies.pop(self.destinations.pop(destination), None)
+
+        with self.connection:
+            self.connection.executemany(
+                INSERT_COPY, ((self.folder, destination, md5, source, size, self.parameters) for md5, source, destination, size in done)
+            )
+            self.connection.executemany(DELETE_COPY, ((destination,) for destination in removed))
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from .copier import get_ratio_range
+
+HISTOGRAM_BARS = " ▁▂▃▄▅▆▇█"
+
+
+@dataclass(frozen=True)
+class CopyPreview:
+    """
+    What the copier would select with given settings
+    """
+    total: int
+    matching: int
+    # Pictures passing the size filters by the bigger of their left and right deviations,
+    # the last bin also counts everything above its upper edge
+    histogram: np.ndarray
+    bin_edges: np.ndarray
+
+    def format_histogram(self) -> str:
+        """
+        Returns:
+            str: one bar character per bin, heights relative to the biggest bin
+        """
+        top = self.histogram.max(initial=0)
+        if top == 0:
+            return ""
+        levels = np.ceil(self.histogram / top * (len(HISTOGRAM_BARS) - 1)).astype(int)
+        return "".join(HISTOGRAM_BARS[level] for level in levels)
+
+
+class PicturesSnapshot:
+    """
+    Columns of pictures table used by the copier filter, kept in numpy arrays so a preview of
+    any thresholds is a few vectorized comparisons instead of a db query. Pictures are sorted by
+    deviation, so the deviation condition and the histogram are binary searches.
+    """
+
+    def __init__(self, width: np.ndarray, height: np.ndarray, left_deviation: np.ndarray, right_deviation: np.ndarray):
+        # left < maximum and right < maximum is the bigger one < maximum
+        edge_deviation = np.maximum(left_deviation, right_deviation)
+        order = np.argsort(edge_deviation, kind="stable")
+        self.edge_deviation = edge_deviation[order]
+        self.width = np.asarray(width[order], dtype=np.int32)
+        self.height = np.asarray(height[order], dtype=np.int32)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.whratio = width[order] / height[order]
+
+    def __len__(self) -> int:
+        return len(self.width)
+
+    @classmethod
+    def load(cls, db_path: str) -> "PicturesSnapshot":
+        """
+        Reads the snapshot from a db made by the scaner
+
+        Args:
+            db_path (str): path to the db
+
+        Returns:
+            PicturesSnapshot: columns of every picture
+        """
+        # mode=ro does not create a missing db
+        connection = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+        try:
+            # NULL deviations become infinity, they never match and fall into the last histogram bin
+            rows = connection.execute(
+                """
+                    SELECT IFNULL(width, 0), IFNULL(height, 0), IFNULL(left_deviation, 9e999), IFNULL(right_deviation, 9e999)
+                    FROM pictures;
+                """
+            ).fetchall()
+        finally:
+            connection.close()
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        return cls(*columns.T)
+
+    def get_preview(
+        self,
+        minimum_width: int,
+        minimum_height: int,
+        maximum_deviation: float,
+        ratio_range: tuple[float, float],
+        bins: int = 20
+    ) -> CopyPreview:
+        """
+        Counts pictures matching the same conditions as Copier.get_filter
+
+        Args:
+            minimum_width (int): pictures have to be wider
+            minimum_height (int): pictures have to be higher
+            maximum_deviation (float): both edges have to deviate less...
+            ratio_range (tuple[float, float]): ...or width / height has to be within this exclusive range
+            bins (int, optional): histogram bins between 0 and twice maximum_deviation. Defaults to 20.
+
+        Returns:
+            CopyPreview: amount of matching pictures and deviations histogram
+        """
+        minimum_ratio, maximum_ratio = ratio_range
+        size_matching = (self.width > minimum_width) & (self.height > minimum_height)
+        # Pictures before plain_end have both edges below maximum_deviation
+        plain_end = int(np.searchsorted(self.edge_deviation, maximum_deviation, side="left"))
+        ratio_matching = (self.whratio[plain_end:] > minimum_ratio) & (self.whratio[plain_end:] < maximum_ratio)
+        matching = np.count_nonzero(size_matching[:plain_end]) + np.count_nonzero(size_matching[plain_end:] & ratio_matching)
+
+        upper = max(2.0 * maximum_deviation, 1.0)
+        bin_edges = np.linspace(0.0, upper, bins + 1)
+        # Size matching pictures before every edge, the last bin takes everything above upper
+        matching_before = np.concatenate(([0], np.cumsum(size_matching)))
+        positions = np.searchsorted(self.edge_deviation, bin_edges, side="left")
+        positions[-1] = len(self)
+        histogram = np.diff(matching_before[positions])
+        return CopyPreview(len(self), int(matching), histogram, bin_edges)
+
+    def get_settings_preview(self, settings: dict[str, Any], bins: int = 20) -> CopyPreview:
+        """
+        Same as get_preview with thresholds from copier settings
+        """
+        return self.get_preview(
+            settings["minimum_width"],
+            settings["minimum_height"],
+            settings["maximum_deviation"],
+            get_ratio_range(settings["sides_ratio"], settings["whratio_deviation"]),
+            bins
+        )
@@ -1,32 +1,133 @@
+import io
+import json
+import mmap
 import os
 import re
 import shutil
 import sqlite3
-import statistics
 import time
+import zlib
 from collections.abc import Callable
-from queue import Queue
-from threading import Lock, Thread
-from typing import Any, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from typing import Any, Iterable, Iterator
 
+import numpy as np
 # pylint: disable=no-name-in-module, attribute-defined-outside-init
-from colormath.color_conversions import \
-    convert_color as colormath_convert_color
 from colormath.color_diff import (delta_e_cie1976, delta_e_cie1994,
                                   delta_e_cie2000, delta_e_cmc)
 from colormath.color_objects import LabColor, sRGBColor
 from PIL import Image, ImageFile, UnidentifiedImageError
-from PyQt6.QtCore import QObject, pyqtSignal
 
-from ..utils.md5 import get_file_md5
+from ..utils.files_IO import read_file_buffer
+from ..utils.hashing import get_data_hash, get_file_hash, get_hash_name, get_hasher
+from ..utils.logger import get_logger
+from ..utils.memory import MemoryBudget, get_decoded_size, get_peak_rss
+from ..utils.profiling import StageProfiler
+from ..utils.progress import ProgressSnapshot, ProgressTracker
+from ..utils.signal import Signal
+from . import deviation, similarity
+from .db_writer import ResultWriter, Statements
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
-lock = Lock()
 
-class Scaner(QObject):
-    initialized_signal = pyqtSignal(int)
-    message_signal = pyqtSignal(str)
-    image_scanned_signal = pyqtSignal(int)
+_logger = get_logger(__file__)
+
+INSERT_PICTURE = """
+    INSERT OR IGNORE INTO pictures(
+        md5, path, width, height, top_crop, bottom_crop, left_deviation, right_deviation,
+        comparison_function, pixel_scan_frequency, addition_date, addition_time, hash_algorithm, early_exit, dhash, whratio
+    ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+INSERT_DEVIATION = "INSERT OR REPLACE INTO deviations VALUES(?, ?, ?, ?, ?);"
+# Rescored deviations become the ones the copier, the watcher and the preview read from pictures
+UPDATE_PICTURE_DEVIATION = """
+    UPDATE pictures SET
+        top_crop = ?, bottom_crop = ?, left_deviation = ?, right_deviation = ?,
+        comparison_function = ?, pixel_scan_frequency = ?, early_exit = ?
+    WHERE md5 = ?;
+"""
+INSERT_EDGES = "INSERT OR IGNORE INTO edges VALUES(?, ?, ?, ?, ?);"
+# Settings which change deviations, (md5, these settings) is the key of deviations table
+DEVIATION_PARAMETERS = (
+    "deviation_engine", "color_algorithm_index", "top_crop", "bottom_crop", "pixel_scan_frequency",
+    "lab_table_bits", "mode_tolerance_bits",
+    "adaptive_sampling", "adaptive_threshold", "adaptive_confidence_z", "adaptive_min_samples"
+)
+INSERT_STATS = "INSERT INTO scan_stats VALUES(?, ?, ?, ?, ?, ?, ?);"
+PROFILED_STAGES = ("hash", "decode", "convert", "deviation", "total")
+
+# Seconds a producer waits on a full queue before checking whether the scan was stopped
+QUEUE_TIMEOUT = 0.1
+
+INSERT_FILE = "INSERT OR REPLACE INTO files(path, size, mtime_ns, inode, md5, hash_algorithm) VALUES(?, ?, ?, ?, ?, ?);"
+
+
+def _convert_color(color: sRGBColor, target_class: type[LabColor]) -> LabColor:
+    # colormath.color_conversions imports networkx, which takes longer than the rest of the scaner together,
+    # only colormath engine needs it
+    from colormath.color_conversions import convert_color # pylint: disable=import-outside-toplevel
+    return convert_color(color, target_class)
+
+
+class Scaner:
+    default_settings: dict[str, Any] = {
+        # "numpy" - vectorized engine from deviation.py, "colormath" - per pixel colormath calls
+        "deviation_engine": "numpy",
+        # "threads" - threading.Thread workers, "processes" - ProcessPoolExecutor workers, not limited by GIL
+        "scan_backend": "threads",
+        # amount of files sent to a process worker at once
+        "process_chunk_size": 16,
+        # 1 - full decode, 2/4/8 - JPEGs are decoded downscaled by this factor, faster but less accurate
+        "decode_scale": 1,
+        # results are committed in one transaction per this many images...
+        "db_batch_size": 256,
+        # ...or per this many seconds, whichever comes first
+        "db_flush_interval": 1.0,
+        # hash every file even if its size, modification time and inode did not change since the last scan
+        "verify_hashes": False,
+        # one of utils.hashing.get_hash_algorithms(), stored next to the digest in the md5 column
+        "hash_algorithm": "md5",
+        # above 0 - only size, first and last this many MB of a file are hashed, quicker. A file whose partial hash
+        # matches a known picture is hashed fully, with that picture, to confirm they are the same
+        "partial_hash_size": 0,
+        # maximum amount of found files waiting to be scanned
+        "enumeration_queue_size": 1024,
+        # how often the total amount of found files is reported while the folder is walked, in seconds
+        "enumeration_report_interval": 0.5,
+        # bits per channel of precomputed sRGB to Lab table used by numpy engine, 8 - exact, less - quantized, 0 - no table
+        "lab_table_bits": 8,
+        # folder where the table is stored, it is built on first use
+        "lab_table_folder": "./cache",
+        # lowest bits of every channel ignored when looking for the prevailing color, 0 - exact colors
+        "mode_tolerance_bits": 0,
+        # numpy engine samples edges coarse to fine and stops once deviation is confidently above or below the threshold
+        "adaptive_sampling": False,
+        "adaptive_threshold": 2.0,
+        # confidence interval width in standard errors
+        "adaptive_confidence_z": 3.0,
+        # amount of pixels sampled at the coarsest level
+        "adaptive_min_samples": 32,
+        # keep left and right edge columns in edges table, so deviations can be recomputed without decoding
+        "store_edges": True,
+        # "scan" - scan scan_folder, "rescore" - recompute deviations for current parameters from edges table
+        # and make them the deviations of pictures table
+        "scan_mode": "scan",
+        "progress_interval": 0.2,
+        "progress_log_interval": 5.0,
+        "profiling": False,
+        "profiling_table": False,
+        "perceptual_hash": True,
+        # Decoded images of all workers together, 0 disables the limit
+        "memory_budget_mb": 2048,
+        # threads backend: every changed file is read once by a read-ahead thread, then hashed and decoded from memory
+        "read_ahead": True,
+        # maximum amount of read files waiting for a worker
+        "read_ahead_depth": 8,
+        # files of at least this many MB are memory mapped instead of read, 0 - never
+        "read_ahead_mmap_mb": 64
+    }
 
     def get_color_algorithm(self, index: int) -> Callable[[LabColor, LabColor], float]:
         algorithms = {
@@ -38,97 +139,554 @@ class Scaner(QObject):
         return algorithms[index]
 
     def get_prevailing_color(self, colors: Iterable[tuple[int, int, int]]) -> LabColor:
-        modes = tuple(zip(*statistics.multimode(colors)))
+        red, green, blue = deviation.get_mode_color(np.array(list(colors)), self.settings["mode_tolerance_bits"]).tolist()
 
-        red = sum(modes[0]) // len(modes[0])
-        green = sum(modes[1]) // len(modes[1])
-        blue = sum(modes[2]) // len(modes[2])
+        return _convert_color(sRGBColor(red, green, blue, is_upscaled=True), LabColor)
 
-        return colormath_convert_color(sRGBColor(red, green, blue, is_upscaled=True), LabColor)
-
-    def get_vertical_line_prevailing_color(self, img: Image.Image, pixel_x_pos: int) -> LabColor:
+    def get_vertical_line_prevailing_color(self, img: Image.Image, pixel_x_pos: int, pixel_scan_frequency: int) -> LabColor:
         colors = (
             img.getpixel((pixel_x_pos, pixel_y_pos))
-            for pixel_y_pos in range(0, img.height-1, self.settings["pixel_scan_frequency"])
+            for pixel_y_pos in range(0, img.height-1, pixel_scan_frequency)
         )
 
         return self.get_prevailing_color(colors)
 
-    def get_vertical_line_deviation(self, img: Image.Image, mode_lab_color: LabColor, pixel_x_pos: int) -> float:
-        deviation = 0
-        for pixel_y_pos in range(0, img.height-1, self.settings["pixel_scan_frequency"]):
+    def get_vertical_line_deviation(
+        self, img: Image.Image, mode_lab_color: LabColor, pixel_x_pos: int, pixel_scan_frequency: int
+    ) -> float:
+        total_deviation = 0
+        for pixel_y_pos in range(0, img.height-1, pixel_scan_frequency):
             red, green, blue = img.getpixel((pixel_x_pos, pixel_y_pos))[:3]
             rgb_color = sRGBColor(red, green, blue, is_upscaled=True)
-            lab_pixel_color = colormath_convert_color(rgb_color, LabColor)
-            deviation += self.settings["color_algorithm"](mode_lab_color, lab_pixel_color)
+            lab_pixel_color = _convert_color(rgb_color, LabColor)
+            total_deviation += self.settings["color_algorithm"](mode_lab_color, lab_pixel_color)
 
-        return deviation/(img.height/self.settings["pixel_scan_frequency"])
+        return total_deviation/(img.height/pixel_scan_frequency)
 
-    def get_edges_deviations(self, img: Image.Image) -> tuple[float, float]:
-        # TODO: В случае градиентного фона распознавания не будет, вариант - отслеживание резкости изменения фона
-        img = img.crop(
-            (
-                0,
-                int(img.height*self.settings["top_crop"]),
-                img.width,
-                int(img.height*(1 - self.settings["bottom_crop"]))
-            )
-        )
+    def get_edge_strips(self, img: Image.Image) -> tuple[Image.Image, Image.Image]:
+        # Crop before converting, so only two 1 pixel wide strips are converted to RGBA
+        left_strip = img.crop((0, 0, 1, img.height)).convert("RGBA")
+        right_strip = img.crop((img.width-1, 0, img.width, img.height)).convert("RGBA")
 
-        left_edge_mode_lab_color = self.get_vertical_line_prevailing_color(img, 0)
-        right_edge_mode_lab_color = self.get_vertical_line_prevailing_color(img, img.width-1)
-        deviation_left = self.get_vertical_line_deviation(img, left_edge_mode_lab_color, 0)
-        deviation_right = self.get_vertical_line_deviation(img, right_edge_mode_lab_color, img.width-1)
+        return left_strip, right_strip
 
-        return deviation_left, deviation_right
+    def crop_strip(self, strip: Image.Image) -> Image.Image:
+        top = int(strip.height*self.settings["top_crop"])
+        bottom = int(strip.height*(1 - self.settings["bottom_crop"]))
+        return strip.crop((0, top, 1, bottom))
 
-    def _run_thread(self):
-        while not self.pics_queue.empty():
-            filename = self.pics_queue.get()
-            md5 = get_file_md5(filename)
+    def get_edges_deviations(
+        self, left_strip: Image.Image, right_strip: Image.Image, scale: int = 1, timings: dict[str, float] | None = None
+    ) -> tuple[float, float, bool]:
+        # TODO: В случае градиентного фона распознавания не будет, вариант - отслеживание резкости изменения фона
+        # A downscaled image has fewer rows, keep roughly the same amount of samples
+        pixel_scan_frequency = max(1, self.settings["pixel_scan_frequency"] // scale)
+
+        if self.settings["deviation_engine"] == "numpy":
+            with self.profiler.stage(timings, "convert"):
+                left_pixels = deviation.get_strip_pixels(self.crop_strip(left_strip))
+                right_pixels = deviation.get_strip_pixels(self.crop_strip(right_strip))
+
+            delta_e = deviation.get_delta_e_function(self.settings["color_algorithm_index"])
+            with self.profiler.stage(timings, "deviation"):
+                if self.settings["adaptive_sampling"]:
+                    deviation_left, early_exit_left = deviation.get_column_deviation_adaptive(
+                        left_pixels, pixel_scan_frequency, delta_e,
+                        self.settings["adaptive_threshold"], self.settings["adaptive_confidence_z"],
+                        self.settings["adaptive_min_samples"], self.lab_table, self.settings["mode_tolerance_bits"]
+                    )
+                    deviation_right, early_exit_right = deviation.get_column_deviation_adaptive(
+                        right_pixels, pixel_scan_frequency, delta_e,
+                        self.settings["adaptive_threshold"], self.settings["adaptive_confidence_z"],
+                        self.settings["adaptive_min_samples"], self.lab_table, self.settings["mode_tolerance_bits"]
+                    )
+                    return deviation_left, deviation_right, early_exit_left or early_exit_right
+
+                deviation_left = deviation.get_column_deviation(
+                    left_pixels, pixel_scan_frequency, delta_e, self.lab_table, self.settings["mode_tolerance_bits"]
+                )
+                deviation_right = deviation.get_column_deviation(
+                    right_pixels, pixel_scan_frequency, delta_e, self.lab_table, self.settings["mode_tolerance_bits"]
+                )
+                return deviation_left, deviation_right, False
+
+        with self.profiler.stage(timings, "convert"):
+            left_strip = self.crop_strip(left_strip)
+            right_strip = self.crop_strip(right_strip)
+
+        # colormath converts every pixel on the fly, so conversion is a part of deviation here
+        with self.profiler.stage(timings, "deviation"):
+            left_edge_mode_lab_color = self.get_vertical_line_prevailing_color(left_strip, 0, pixel_scan_frequency)
+            right_edge_mode_lab_color = self.get_vertical_line_prevailing_color(right_strip, 0, pixel_scan_frequency)
+            deviation_left = self.get_vertical_line_deviation(left_strip, left_edge_mode_lab_color, 0, pixel_scan_frequency)
+            deviation_right = self.get_vertical_line_deviation(right_strip, right_edge_mode_lab_color, 0, pixel_scan_frequency)
+
+        return deviation_left, deviation_right, False
+
+    def load_lab_table(self):
+        self.lab_table = None
+        if self.settings["deviation_engine"] == "numpy" and self.settings["lab_table_bits"] > 0:
+            self.lab_table = deviation.get_lab_table(self.settings["lab_table_bits"], self.settings["lab_table_folder"])
+
+    def get_file_key(self, filename: str) -> tuple[int, int, int]:
+        stat = os.stat(filename)
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def is_file_unchanged(self, filename: str, file_key: tuple[int, int, int]) -> bool:
+        if self.settings["verify_hashes"]:
+            return False
+        indexed = self.files_index.get(filename)
+        return indexed is not None and indexed[:3] == file_key
+
+    def scan_file(
+        self, filename: str, file_key: tuple[int, int, int] | None = None, data: bytes | mmap.mmap | None = None
+    ) -> Statements:
+        """
+        Args:
+            filename (str): path and name of the file
+            file_key (tuple[int, int, int] | None, optional): (size, mtime_ns, inode), read from disk if None
+            data (bytes | mmap.mmap | None, optional): contents of the file if they are already read,
+                the file is then hashed and decoded without reading it again. Defaults to None.
+
+        Returns:
+            Statements: db statements, empty if the file is unchanged
+        """
+        if file_key is None:
+            file_key = self.get_file_key(filename)
+        if self.is_file_unchanged(filename, file_key):
+            return []
+
+        timings = self.profiler.start_item()
+        if timings is None:
+            return self._scan_changed_file(filename, file_key, None, data)
+
+        start = time.perf_counter()
+        statements = self._scan_changed_file(filename, file_key, timings, data)
+        timings["total"] = time.perf_counter() - start
+        self.profiler.add_item(filename, timings)
+        return statements
+
+    def _scan_changed_file(
+        self, filename: str, file_key: tuple[int, int, int], timings: dict[str, float] | None, data: bytes | mmap.mmap | None
+    ) -> Statements:
+        with self.profiler.stage(timings, "hash"):
+            if data is None:
+                md5 = get_file_hash(filename, self.settings["hash_algorithm"], self.settings["partial_hash_size"])
+            else:
+                md5 = get_data_hash(data, self.settings["hash_algorithm"], self.settings["partial_hash_size"])
+            md5, hash_name, is_known = self.claim_picture(filename, md5, data)
+        indexed = self.files_index.get(filename)
+        if indexed is not None and indexed[:3] == file_key and indexed[3:] != (md5, hash_name):
+            if indexed[4] == hash_name:
+                self.message_signal.emit(f"File {filename} has changed without changing its size and time\n")
+
+        statements: Statements = [(INSERT_FILE, (filename, *file_key, md5, hash_name))]
+        # Kept up to date for later scans of the same Scaner, e.g. in watch mode
+        self.files_index[filename] = (*file_key, md5, hash_name)
+        if is_known:
+            return statements
+
+        try:
+            return statements + self._scan_picture(filename, md5, hash_name, timings, data)
+        except BaseException:
+            # Another file with the same contents has to be scanned again
+            with self._pictures_lock:
+                self.existing_md5s.discard(md5)
+            raise
+
+    def claim_picture(self, filename: str, md5: str, data: bytes | mmap.mmap | None) -> tuple[str, str, bool]:
+        """
+        Checks if a hash belongs to a known picture, and if not, marks it as known, so workers
+        scanning files with the same contents do not decode the picture twice
+
+        Args:
+            filename (str): path and name of the file
+            md5 (str): hash of the file by the settings
+            data (bytes | mmap.mmap | None): contents of the file if they are already read
+
+        Returns:
+            tuple[str, str, bool]: hash, its name and whether the picture was known. A partial hash of a file
+                which is not the known picture with that partial hash is replaced by the full hash.
+        """
+        hash_name = self.settings["hash_name"]
+        if hash_name != self.settings["hash_algorithm"] and md5 in self.existing_md5s:
+            md5, hash_name = self.confirm_partial_match(filename, md5, data)
+        with self._pictures_lock:
             if md5 in self.existing_md5s:
-                self.pics_queue.task_done()
-                self.images_scanned += 1
-                self.image_scanned_signal.emit(self.images_scanned)
-                continue
-
+                return md5, hash_name, True
+            self._add_picture(md5, filename, hash_name)
+        return md5, hash_name, False
+
+    def _add_picture(self, md5: str, filename: str, hash_name: str):
+        self.existing_md5s.add(md5)
+        if hash_name != self.settings["hash_algorithm"]:
+            self.picture_paths.setdefault(md5, filename)
+
+    def confirm_partial_match(self, filename: str, md5: str, data: bytes | mmap.mmap | None) -> tuple[str, str]:
+        """
+        Partial hashes of different files may be equal, a match is confirmed by full hashes of both files
+
+        Args:
+            filename (str): path and name of the file
+            md5 (str): partial hash of the file, equal to the one of a known picture
+            data (bytes | mmap.mmap | None): contents of the file if they are already read
+
+        Returns:
+            tuple[str, str]: the partial hash and its name if the file is the known picture,
+                otherwise the full hash and the algorithm name
+        """
+        algorithm = self.settings["hash_algorithm"]
+        full_md5 = get_file_hash(filename, algorithm) if data is None else get_data_hash(data, algorithm)
+        known_full_md5 = self.full_hashes.get(md5)
+        known_path = self.picture_paths.get(md5)
+        if known_full_md5 is None and known_path is not None:
             try:
+                known_full_md5 = get_file_hash(known_path, algorithm)
+            except OSError:
+                # The known picture can not be compared anymore, the file is kept apart from it
+                pass
+            else:
+                self.full_hashes[md5] = known_full_md5
+        if full_md5 == known_full_md5:
+            return md5, self.settings["hash_name"]
+        return full_md5, algorithm
+
+    def _scan_picture(
+        self, filename: str, md5: str, hash_name: str, timings: dict[str, float] | None, data: bytes | mmap.mmap | None
+    ) -> Statements:
+        statements: Statements = []
+
+        # Only the header is read here, size is known before decoding
+        try:
+            if data is None:
                 img = Image.open(filename)
-            except UnidentifiedImageError:
-                self.pics_queue.task_done()
-                self.images_scanned += 1
-                self.image_scanned_signal.emit(self.images_scanned)
-                continue
-
-            left_deviation, right_deviation = self.get_edges_deviations(img.convert("RGBA"))
-
-            addition_date = time.strftime("%d-%m-%Y")
-            addition_time = time.strftime("%H:%M:%S")
-
-            values = (
-                md5, filename,
-                img.width, img.height,
-                self.settings["top_crop"], self.settings["bottom_crop"],
-                left_deviation, right_deviation,
-                self.settings["color_algorithm"].__name__,
-                self.settings["pixel_scan_frequency"],
-                addition_date, addition_time
+            else:
+                # mmap is a file object itself, BytesIO would copy it
+                img = Image.open(data if isinstance(data, mmap.mmap) else io.BytesIO(data))
+        except UnidentifiedImageError:
+            return statements
+        width, height = img.size
+        self.apply_draft(img)
+
+        decoded_size = get_decoded_size(img)
+        with self.profiler.stage(timings, "memory_wait"):
+            self.memory_budget.acquire(decoded_size)
+        try:
+            with img:
+                # Image is decoded by the first crop
+                with self.profiler.stage(timings, "decode"):
+                    # draft rounds the reduced size up, 1001 px at 1/8 is 126 px
+                    scale = max(1, round(width / img.width))
+                    left_strip, right_strip = self.get_edge_strips(img)
+
+                dhash = None
+                if self.settings["perceptual_hash"]:
+                    with self.profiler.stage(timings, "dhash"):
+                        dhash = similarity.get_dhash(img)
+        finally:
+            # Closing the image frees its buffer, only the strips are used further
+            self.memory_budget.release(decoded_size)
+
+        left_deviation, right_deviation, early_exit = self.get_edges_deviations(left_strip, right_strip, scale, timings)
+
+        addition_date = time.strftime("%d-%m-%Y")
+        addition_time = time.strftime("%H:%M:%S")
+
+        values = (
+            md5, filename,
+            width, height,
+            self.settings["top_crop"], self.settings["bottom_crop"],
+            left_deviation, right_deviation,
+            self.settings["color_algorithm"].__name__,
+            self.settings["pixel_scan_frequency"],
+            addition_date, addition_time,
+            hash_name,
+            early_exit,
+            dhash,
+            width / height
+        )
+        statements.append((INSERT_PICTURE, values))
+        statements.append((INSERT_DEVIATION, (md5, self.settings["parameters_key"], left_deviation, right_deviation, early_exit)))
+        if self.settings["store_edges"]:
+            statements.append((INSERT_EDGES, (md5, left_strip.height, scale, *self.pack_strips(left_strip, right_strip))))
+        return statements
+
+    def apply_draft(self, img: Image.Image):
+        if img.format != "JPEG":
+            return
+        decode_scale = self.settings["decode_scale"]
+        # Low-memory path: a JPEG which does not fit the budget is decoded at a smaller scale
+        while self.memory_budget.limit and decode_scale < 8 and get_decoded_size(img) > self.memory_budget.limit * decode_scale**2:
+            decode_scale *= 2
+        if decode_scale > 1:
+            # DCT scaling, JPEG is decoded straight into 1/2, 1/4 or 1/8 of its size
+            img.draft("RGB", (img.width // decode_scale, img.height // decode_scale))
+
+    def pack_strips(self, left_strip: Image.Image, right_strip: Image.Image) -> tuple[bytes, bytes]:
+        return zlib.compress(left_strip.tobytes(), 1), zlib.compress(right_strip.tobytes(), 1)
+
+    def unpack_strips(self, height: int, left: bytes, right: bytes) -> tuple[Image.Image, Image.Image]:
+        left_strip = Image.frombytes("RGBA", (1, height), zlib.decompress(left))
+        right_strip = Image.frombytes("RGBA", (1, height), zlib.decompress(right))
+        return left_strip, right_strip
+
+    def get_parameters_key(self) -> str:
+        return json.dumps({parameter: self.settings[parameter] for parameter in DEVIATION_PARAMETERS}, sort_keys=True)
+
+    def _rescore(self):
+        # Deviations are computed from the edges table alone, no image is opened
+        self.cursor.execute("SELECT COUNT(md5) FROM edges;")
+        self.set_files_found(self.cursor.fetchone()[0])
+
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT md5, height, scale, left, right FROM edges;")
+        for md5, height, scale, left, right in cursor:
+            left_deviation, right_deviation, early_exit = self.get_edges_deviations(
+                *self.unpack_strips(height, left, right), scale
             )
+            self.writer.put([
+                (INSERT_DEVIATION, (md5, self.settings["parameters_key"], left_deviation, right_deviation, early_exit)),
+                (UPDATE_PICTURE_DEVIATION, (
+                    self.settings["top_crop"], self.settings["bottom_crop"], left_deviation, right_deviation,
+                    self.settings["color_algorithm"].__name__, self.settings["pixel_scan_frequency"], early_exit, md5
+                ))
+            ])
+
+    def on_results_committed(self, images_amount: int):
+        self.progress.add(images_amount)
+
+    def on_progress(self, snapshot: ProgressSnapshot):
+        self.image_scanned_signal.emit(snapshot.done)
+        self.progress_signal.emit(snapshot)
+
+    def set_files_found(self, files_found: int):
+        self.progress.set_total(files_found)
+        self.initialized_signal.emit(files_found)
+
+    def enumerate_folder(self, folder: str, recursive: bool) -> Iterator[tuple[str, tuple[int, int, int]]]:
+        folders = [folder]
+        while folders:
             try:
-                lock.acquire(True)
-                self.cursor.execute("INSERT INTO pictures VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);", values)
-                self.connection.commit()
-            finally:
-                lock.release()
+                with os.scandir(folders.pop()) as entries:
+                    for entry in entries:
+                        # A file removed during the walk fails alone, the rest of the folder is still walked
+                        try:
+                            if recursive and entry.is_dir(follow_symlinks=False):
+                                folders.append(entry.path)
+                                continue
+                            if not entry.is_file():
+                                continue
+                            # stat is cached by scandir, on Windows inode is only available through entry.inode()
+                            stat = entry.stat()
+                            file_key = (stat.st_size, stat.st_mtime_ns, stat.st_ino or entry.inode())
+                        except OSError as e:
+                            self.message_signal.emit(f"Could not read file {entry.path}: {e.strerror}\n")
+                            continue
+                        yield entry.path, file_key
+            except OSError as e:
+                self.message_signal.emit(f"Could not read folder {e.filename}: {e.strerror}\n")
+
+    def _put(self, queue: Queue, item: Any) -> bool:
+        """
+        Puts an item to a bounded queue unless the scan is stopped, so a producer never waits
+        for consumers which are gone
+
+        Returns:
+            bool: False if the scan was stopped and the item was not put
+        """
+        while not self.stop_event.is_set():
+            try:
+                queue.put(item, timeout=QUEUE_TIMEOUT)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _get(self, queue: Queue) -> Any:
+        """
+        Gets an item from a queue, None if the scan is stopped
+        """
+        while not self.stop_event.is_set():
+            try:
+                return queue.get(timeout=QUEUE_TIMEOUT)
+            except Empty:
+                pass
+        return None
+
+    def _drain_queues(self):
+        for queue in (self.pics_queue, self.read_queue):
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except Empty:
+                    break
+                if item is not None and len(item) > 2 and isinstance(item[2], mmap.mmap):
+                    item[2].close()
+
+    def _enumerate_files(self, items: Iterable[tuple[str, tuple[int, int, int]]], consumers_amount: int):
+        report_time = time.monotonic()
+        try:
+            for item in items:
+                if not self._put(self.pics_queue, item):
+                    break
+                self.files_found += 1
+                if time.monotonic() - report_time > self.settings["enumeration_report_interval"]:
+                    self.set_files_found(self.files_found)
+                    report_time = time.monotonic()
+        finally:
+            self.set_files_found(self.files_found)
+            for _ in range(consumers_amount):
+                self._put(self.pics_queue, None)
+
+    def _read_ahead(self, consumers_amount: int):
+        # Disk reads of the next files overlap with decoding of the current ones
+        mmap_threshold = self.settings["read_ahead_mmap_mb"] * 2**20
+        try:
+            while (item := self._get(self.pics_queue)) is not None:
+                filename, file_key = item
+                data = None
+                if not self.is_file_unchanged(filename, file_key):
+                    start = time.perf_counter()
+                    try:
+                        data = read_file_buffer(filename, mmap_threshold)
+                    except OSError:
+                        # The worker opens the file itself and reports the error
+                        pass
+                    if self.profiler.enabled:
+                        self.profiler.add_duration("read", time.perf_counter() - start)
+                if not self._put(self.read_queue, (filename, file_key, data)):
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+                    break
+        finally:
+            for _ in range(consumers_amount):
+                self._put(self.read_queue, None)
+
+    def _scan_file_safe(
+        self, filename: str, file_key: tuple[int, int, int], data: bytes | mmap.mmap | None = None
+    ) -> Statements:
+        try:
+            return self.scan_file(filename, file_key, data)
+        except OSError as e:
+            # Files may be moved or deleted between enumeration and scanning
+            self.message_signal.emit(f"Could not scan file {filename}: {e}\n")
+            return []
+        except Image.DecompressionBombError as e:
+            self.message_signal.emit(f"Skipped file {filename}: {e}\n")
+            return []
+        except Exception as e: # pylint: disable=broad-except
+            # A broken file must not stop the worker, queues would wait for it forever
+            _logger.exception("Could not scan file %s", filename)
+            self.message_signal.emit(f"Could not scan file {filename}: {e!r}\n")
+            return []
 
-            self.pics_queue.task_done()
+    def _run_thread(self):
+        while True:
+            start = time.perf_counter()
+            item = self.work_queue.get()
+            if self.profiler.enabled:
+                # Time a worker waits for enumeration or read-ahead, or for the queue lock
+                self.profiler.add_duration("queue_wait", time.perf_counter() - start)
+            if item is None:
+                break
+            statements = self._scan_file_safe(*item)
+            if len(item) > 2 and isinstance(item[2], mmap.mmap):
+                item[2].close()
+            if statements:
+                # Only files which were actually read count towards bytes/sec
+                self.progress.add(bytes_amount=item[1][0])
+            self.writer.put(statements)
+
+    def _run_threads(self, threads_amount: int):
+        threads = [Thread(target=self._run_thread) for _ in range(threads_amount)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _put_chunks_results(self, futures: dict[Future, int], done: Iterable[Future]):
+        for future in done:
+            statements_list, profiled_items, messages = future.result()
+            self.profiler.extend(profiled_items)
+            for message in messages:
+                self.message_signal.emit(message)
+            # Only changed files are sent to processes, each of them was read
+            self.progress.add(bytes_amount=futures.pop(future))
+            for statements in statements_list:
+                if self._is_claimed_elsewhere(statements):
+                    # Another worker got a picture with the same partial hash, the parent confirms which one it is
+                    statements = self._scan_file_safe(*self._get_file_item(statements))
+                # Workers update only their own copies of the indexes
+                for sql, values in statements:
+                    if sql == INSERT_FILE:
+                        self.files_index[values[0]] = values[1:]
+                    elif sql == INSERT_PICTURE:
+                        self._add_picture(values[0], values[1], values[12])
+                self.writer.put(statements)
+
+    def _is_claimed_elsewhere(self, statements: Statements) -> bool:
+        if self.settings["hash_name"] == self.settings["hash_algorithm"]:
+            # Equal full hashes are the same picture, the second insert is ignored
+            return False
+        return any(
+            sql == INSERT_PICTURE and values[12] != self.settings["hash_algorithm"] and values[0] in self.existing_md5s
+            for sql, values in statements
+        )
 
-            self.images_scanned += 1
-            self.image_scanned_signal.emit(self.images_scanned)
+    def _get_file_item(self, statements: Statements) -> tuple[str, tuple[int, int, int]]:
+        filename, *file_key = next(values for sql, values in statements if sql == INSERT_FILE)[:4]
+        return filename, tuple(file_key)
+
+    def _run_processes(self, processes_amount: int):
+        chunk_size = self.settings["process_chunk_size"]
+        with ProcessPoolExecutor(
+            max_workers=processes_amount,
+            initializer=_init_process_worker,
+            initargs=(self.settings, self.existing_md5s, self.picture_paths)
+        ) as executor:
+            # Future to the size of its chunk in bytes
+            futures: dict[Future, int] = {}
+            chunk = []
+            while (item := self.pics_queue.get()) is not None or chunk:
+                if item is not None:
+                    # Unchanged files are skipped here, so the index is not sent to every process
+                    if self.is_file_unchanged(*item):
+                        self.writer.put([])
+                        continue
+                    # The known hash lets the worker report files changed without changing their size and time
+                    chunk.append((*item, self.files_index.get(item[0])))
+                    if len(chunk) < chunk_size:
+                        continue
+
+                # Keep only a couple of chunks per process in flight, so memory does not grow with the folder size
+                if len(futures) >= processes_amount * 2:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    self._put_chunks_results(futures, done)
+                futures[executor.submit(_scan_chunk, chunk)] = sum(file_key[0] for _, file_key, _ in chunk)
+                chunk = []
+                if item is None:
+                    break
+
+            self._put_chunks_results(futures, list(futures))
 
     def __init__(self):
-        super().__init__()
+        self.initialized_signal = Signal()
+        self.message_signal = Signal()
+        self.image_scanned_signal = Signal()
+        self.progress_signal = Signal()
+
+        self.progress = ProgressTracker(logger=_logger)
+        self.progress.updated_signal.connect(self.on_progress)
+        self.profiler = StageProfiler()
+        self.memory_budget = MemoryBudget()
+
         self.settings: dict[str, Any] = {}
+        self.lab_table = None
+        self.existing_md5s: set[str] = set()
+        # Paths of known pictures and their full hashes, used only with partial hashes
+        self.picture_paths: dict[str, str] = {}
+        self.full_hashes: dict[str, str] = {}
+        self._pictures_lock = Lock()
 
     def copy_file(self, filename: str, dest_folder: str = os.getcwd(), maximum_copies_amount: int = 3):
         if not os.path.exists(dest_folder):
@@ -150,14 +708,24 @@ class Scaner(QObject):
         shutil.copy2(copy_filename, dest_folder)
         os.rename(copy_filename, filename)
 
-    def run(self):
-        self.images_scanned = 0
+    def add_missing_columns(self, table: str, columns: dict[str, str]):
+        self.cursor.execute(f"PRAGMA table_info({table});")
+        existing_columns = {column[1] for column in self.cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing_columns:
+                self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition};")
 
+    def prepare_settings(self):
+        self.settings = self.default_settings | self.settings
+        self.settings["color_algorithm_index"] = self.settings["color_algorithm"]
         self.settings["color_algorithm"] = self.get_color_algorithm(self.settings["color_algorithm"])
-        self.connection = sqlite3.connect(f"./{self.settings['db_name']}.db", check_same_thread=False)
-        self.cursor = self.connection.cursor()
-        self.pics_queue: Queue[str] = Queue()
+        # Raises ValueError before any worker starts, instead of failing on every file
+        get_hasher(self.settings["hash_algorithm"])
+        self.settings["hash_name"] = get_hash_name(self.settings["hash_algorithm"], self.settings["partial_hash_size"])
+        self.settings["parameters_key"] = self.get_parameters_key()
+        self.load_lab_table()
 
+    def create_tables(self):
         self.cursor.execute(
             """
                 CREATE TABLE IF NOT EXISTS pictures(
@@ -178,28 +746,244 @@ class Scaner(QObject):
                     pixel_scan_frequency INT,
 
                     addition_date TEXT,
-                    addition_time TEXT
+                    addition_time TEXT,
+
+                    hash_algorithm TEXT DEFAULT 'md5',
+
+                    early_exit INT DEFAULT 0,
+
+                    dhash INT,
+
+                    whratio REAL
                 );
             """
         )
+        self.add_missing_columns(
+            "pictures", {"hash_algorithm": "TEXT DEFAULT 'md5'", "early_exit": "INT DEFAULT 0", "dhash": "INT", "whratio": "REAL"}
+        )
         self.connection.commit()
 
-        self.cursor.execute("SELECT md5 FROM pictures;")
-        self.existing_md5s = tuple(file[0] for file in self.cursor.fetchall())
+        self.cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS files(
+                    path TEXT PRIMARY KEY,
 
-        if self.settings["scan_folder_subfolders"]:
-            for path, _, files in os.walk(self.settings["scan_folder"]):
-                for name in files:
-                    fpath = os.path.join(path, name)
-                    self.pics_queue.put(fpath)
-        else:
-            for file in os.listdir(self.settings["scan_folder"]):
-                self.pics_queue.put(file)
+                    size INT,
+                    mtime_ns INT,
+                    inode INT,
 
-        self.initialized_signal.emit(self.pics_queue.qsize())
+                    md5 TEXT,
+                    hash_algorithm TEXT DEFAULT 'md5'
+                );
+            """
+        )
+        self.add_missing_columns("files", {"hash_algorithm": "TEXT DEFAULT 'md5'"})
+        self.connection.commit()
 
-        threads_amount = min(self.settings["threads_amount"], self.pics_queue.qsize())
+        self.cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS edges(
+                    md5 TEXT PRIMARY KEY,
 
-        for _ in range(threads_amount):
-            thread = Thread(target=self._run_thread)
-            thread.start()
+                    height INT,
+                    scale INT,
+
+                    left BLOB,
+                    right BLOB
+                );
+            """
+        )
+        self.cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS deviations(
+                    md5 TEXT,
+                    parameters TEXT,
+
+                    left_deviation REAL,
+                    right_deviation REAL,
+
+                    early_exit INT,
+
+                    PRIMARY KEY(md5, parameters)
+                );
+            """
+        )
+        self.connection.commit()
+
+    def save_profile(self):
+        for seconds in self.writer.flush_durations:
+            self.profiler.add_duration("db_flush", seconds)
+        _logger.info("Scan stages, ms:\n%s", self.profiler.format_summary())
+        if not self.settings["profiling_table"]:
+            return
+
+        self.cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS scan_stats(
+                    run TEXT,
+                    path TEXT,
+
+                    hash REAL,
+                    decode REAL,
+                    convert REAL,
+                    deviation REAL,
+                    total REAL
+                );
+            """
+        )
+        run_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.cursor.executemany(INSERT_STATS, (
+            (run_time, path, *(timings.get(stage) for stage in PROFILED_STAGES)) for path, timings in self.profiler.items
+        ))
+        self.connection.commit()
+
+    def open_db(self):
+        """
+        Prepares settings, creates tables and loads indexes of known files, called once before scans
+        """
+        self.prepare_settings()
+        self.connection = sqlite3.connect(f"./{self.settings['db_name']}.db", check_same_thread=False)
+        self.cursor = self.connection.cursor()
+        self.create_tables()
+
+        # Files told apart from a picture with the same partial hash are stored with their full hash
+        hash_names = (self.settings["hash_name"], self.settings["hash_algorithm"])
+        self.cursor.execute("SELECT md5, path, hash_algorithm FROM pictures WHERE hash_algorithm IN (?, ?);", hash_names)
+        self.existing_md5s = set()
+        self.picture_paths = {}
+        partial = self.settings["hash_name"] != self.settings["hash_algorithm"]
+        for md5, path, hash_name in self.cursor:
+            self.existing_md5s.add(md5)
+            if partial and hash_name == self.settings["hash_name"]:
+                self.picture_paths[md5] = path
+        self.full_hashes = {}
+
+        self.cursor.execute("SELECT path, size, mtime_ns, inode, md5, hash_algorithm FROM files;")
+        self.files_index = {path: tuple(file_key) for path, *file_key in self.cursor.fetchall()}
+
+    def _start_writer(self):
+        self.progress.interval = self.settings["progress_interval"]
+        self.progress.log_interval = self.settings["progress_log_interval"]
+        self.progress.start()
+        self.profiler = StageProfiler(self.settings["profiling"])
+
+        self.writer = ResultWriter(
+            f"./{self.settings['db_name']}.db",
+            self.on_results_committed,
+            self.settings["db_batch_size"],
+            self.settings["db_flush_interval"]
+        )
+        self.writer.start()
+
+    def scan(self, items: Iterable[tuple[str, tuple[int, int, int]]]):
+        """
+        Scans files with the configured backend, open_db has to be called first
+
+        Args:
+            items (Iterable[tuple[str, tuple[int, int, int]]]): (path, (size, mtime_ns, inode)) pairs, consumed lazily
+        """
+        self._start_writer()
+        self.files_found = 0
+        self.stop_event = Event()
+        self.pics_queue: Queue[tuple[str, tuple[int, int, int]] | None] = Queue(self.settings["enumeration_queue_size"])
+        self.read_queue: Queue[tuple[str, tuple[int, int, int], bytes | mmap.mmap | None] | None] = Queue(
+            max(1, self.settings["read_ahead_depth"])
+        )
+        threads_amount = self.settings["threads_amount"]
+        processes_mode = self.settings["scan_backend"] == "processes"
+        self.memory_budget = MemoryBudget(0 if processes_mode else self.settings["memory_budget_mb"] * 2**20)
+        # Process workers would get file contents through a pipe, they read files themselves
+        read_ahead = self.settings["read_ahead"] and not processes_mode
+
+        # Files are scanned while the folder is still being walked
+        enumeration_thread = Thread(
+            target=self._enumerate_files, args=(items, 1 if processes_mode or read_ahead else threads_amount)
+        )
+        enumeration_thread.start()
+        read_thread = None
+        self.work_queue = self.pics_queue
+        if read_ahead:
+            self.work_queue = self.read_queue
+            read_thread = Thread(target=self._read_ahead, args=(threads_amount,))
+            read_thread.start()
+        try:
+            if processes_mode:
+                self._run_processes(threads_amount)
+            else:
+                self._run_threads(threads_amount)
+        finally:
+            # Consumers are done, or failed. Producers must not wait for free space in the queues then
+            self.stop_event.set()
+            self._drain_queues()
+            enumeration_thread.join()
+            if read_thread is not None:
+                read_thread.join()
+            self._drain_queues()
+            self.writer.close()
+            self.progress.finish()
+
+        if self.profiler.enabled:
+            self.save_profile()
+        self.report_memory()
+
+    def report_memory(self):
+        peak_rss = get_peak_rss()
+        if peak_rss is None:
+            return
+        message = f"Peak memory: {peak_rss / 2**20:.0f} MB"
+        workers_peak_rss = get_peak_rss(children=True)
+        if self.settings["scan_backend"] == "processes" and workers_peak_rss:
+            message += f", worker processes: {workers_peak_rss / 2**20:.0f} MB"
+        if self.memory_budget.limit:
+            message += f", images in flight: {self.memory_budget.peak_in_flight / 2**20:.0f} MB of {self.memory_budget.limit / 2**20:.0f} MB"
+        _logger.info(message)
+        self.message_signal.emit(message + "\n")
+
+    def run(self):
+        try:
+            self.open_db()
+        except ValueError as e:
+            self.message_signal.emit(f"Wrong settings: {e}\n")
+            return
+        if self.settings["scan_mode"] == "rescore":
+            self._start_writer()
+            try:
+                self._rescore()
+            finally:
+                self.writer.close()
+                self.progress.finish()
+            return
+
+        self.scan(self.enumerate_folder(self.settings["scan_folder"], self.settings["scan_folder_subfolders"]))
+
+
+# Scaner used by ProcessPoolExecutor workers, only the parent process writes to db and emits signals
+_process_scaner: Scaner | None = None
+# Messages of the worker's scaner, sent to the parent with the results of a chunk
+_process_messages: list[str] = []
+
+def _init_process_worker(settings: dict[str, Any], existing_md5s: set[str], picture_paths: dict[str, str]):
+    global _process_scaner # pylint: disable=global-statement
+    _process_scaner = Scaner()
+    _process_scaner.message_signal.connect(_process_messages.append)
+    _process_scaner.settings = settings
+    _process_scaner.existing_md5s = existing_md5s
+    _process_scaner.picture_paths = picture_paths
+    _process_scaner.files_index = {}
+    _process_scaner.profiler = StageProfiler(settings["profiling"])
+    # Every process gets an equal share, processes do not share memory
+    _process_scaner.memory_budget = MemoryBudget(settings["memory_budget_mb"] * 2**20 // settings["threads_amount"])
+    _process_scaner.load_lab_table()
+
+def _scan_chunk(
+    files: list[tuple[str, tuple[int, int, int], tuple | None]]
+) -> tuple[list[Statements], list[tuple[str, dict[str, float]]], list[str]]:
+    results = []
+    for filename, file_key, indexed in files:
+        if indexed is not None:
+            _process_scaner.files_index[filename] = indexed
+        results.append(_process_scaner._scan_file_safe(filename, file_key)) # pylint: disable=protected-access
+        _process_scaner.files_index.pop(filename, None)
+    messages = _process_messages.copy()
+    _process_messages.clear()
+    return results, _process_scaner.profiler.pop_items(), messages
@@ -0,0 +1,159 @@
+from collections.abc import Hashable, Iterable, Iterator
+
+import numpy as np
+from PIL import Image
+
+# dHash compares neighbouring pixels of a (DHASH_SIZE + 1) x DHASH_SIZE grayscale thumbnail
+DHASH_SIZE = 8
+DHASH_BITS = DHASH_SIZE * DHASH_SIZE
+
+
+def get_dhash(img: Image.Image) -> int:
+    """
+    Computes 64 bit difference hash. Re-encoded, resized or slightly edited copies of
+    an image get hashes within a few bits of each other.
+
+    Args:
+        img (Image.Image): image in any mode
+
+    Returns:
+        int: signed 64 bit hash, so it fits sqlite INTEGER
+    """
+    # Resize first, converting a thumbnail to grayscale is much cheaper than the whole image.
+    # reducing_gap lets Pillow shrink by an integer factor before the precise resampling
+    # Palette, bilevel and 16 bit images can not be resized as they are
+    thumbnail = img.convert("L") if img.mode in ("P", "1") or img.mode.startswith("I;16") else img
+    thumbnail = thumbnail.resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BILINEAR, reducing_gap=2.0).convert("L")
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    value = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return value - (1 << DHASH_BITS) if value >= 1 << (DHASH_BITS - 1) else value
+
+
+def get_hamming_distance(first: int, second: int) -> int:
+    return ((first ^ second) & ((1 << DHASH_BITS) - 1)).bit_count()
+
+
+class HammingIndex:
+    """
+    Multi-index hashing: every hash is split into radius + 1 chunks, and each chunk is a key of its own table.
+    Hashes within radius differ in at most radius bits, so at least one of their chunks is equal,
+    and only hashes sharing a chunk with the query are compared instead of the whole library.
+    """
+
+    def __init__(self, radius: int):
+        self.radius = radius
+        chunks = min(radius + 1, DHASH_BITS)
+        self._bounds = [DHASH_BITS * i // chunks for i in range(chunks + 1)]
+        self._tables: list[dict[int, list[int]]] = [{} for _ in range(chunks)]
+        # Distinct unsigned hashes, keys of every hash and position of every hash
+        self._hashes: list[int] = []
+        self._keys: list[list[Hashable]] = []
+        self._positions: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _get_chunks(self, dhash: int) -> Iterator[int]:
+        for start, end in zip(self._bounds, self._bounds[1:]):
+            yield (dhash >> start) & ((1 << (end - start)) - 1)
+
+    def add(self, dhash: int, key: Hashable):
+        dhash &= (1 << DHASH_BITS) - 1
+        position = self._positions.get(dhash)
+        if position is not None:
+            self._keys[position].append(key)
+            return
+
+        position = len(self._hashes)
+        self._positions[dhash] = position
+        self._hashes.append(dhash)
+        self._keys.append([key])
+        for table, chunk in zip(self._tables, self._get_chunks(dhash)):
+            table.setdefault(chunk, []).append(position)
+
+    def search_positions(self, dhash: int, radius: int | None = None) -> list[tuple[int, int]]:
+        """
+        Finds distinct hashes within radius
+
+        Args:
+            dhash (int): hash to look for
+            radius (int | None, optional): maximum Hamming distance, at most the index radius. Defaults to the index radius.
+
+        Returns:
+            list[tuple[int, int]]: (distance, position) pairs
+        """
+        radius = self.radius if radius is None else min(radius, self.radius)
+        dhash &= (1 << DHASH_BITS) - 1
+        found = []
+        checked = set()
+        for table, chunk in zip(self._tables, self._get_chunks(dhash)):
+            for position in table.get(chunk, ()):
+                if position in checked:
+                    continue
+                checked.add(position)
+                distance = (dhash ^ self._hashes[position]).bit_count()
+                if distance <= radius:
+                    found.append((distance, position))
+        return found
+
+    def search(self, dhash: int, radius: int | None = None) -> list[tuple[int, Hashable]]:
+        """
+        Finds keys with hashes within radius
+
+        Returns:
+            list[tuple[int, Hashable]]: (distance, key) pairs sorted by distance
+        """
+        found = [
+            (distance, key) for distance, position in self.search_positions(dhash, radius) for key in self._keys[position]
+        ]
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def get_clusters(self) -> list[list[Hashable]]:
+        """
+        Groups keys whose hashes are connected by chains of distances within the index radius
+
+        Returns:
+            list[list[Hashable]]: clusters, single keys included
+        """
+        parents = list(range(len(self._hashes)))
+
+        def find(position: int) -> int:
+            while parents[position] != position:
+                parents[position] = parents[parents[position]]
+                position = parents[position]
+            return position
+
+        if self.radius > 0:
+            for position, dhash in enumerate(self._hashes):
+                for _, neighbour in self.search_positions(dhash):
+                    first, second = find(position), find(neighbour)
+                    if first != second:
+                        parents[second] = first
+
+        clusters: dict[int, list[Hashable]] = {}
+        for position, keys in enumerate(self._keys):
+            clusters.setdefault(find(position), []).extend(keys)
+        return list(clusters.values())
+
+
+def build_index(items: Iterable[tuple[Hashable, int]], radius: int) -> HammingIndex:
+    index = HammingIndex(radius)
+    for key, dhash in items:
+        index.add(dhash, key)
+    return index
+
+
+def get_clusters(items: Iterable[tuple[Hashable, int]], radius: int) -> list[list[Hashable]]:
+    """
+    Groups keys whose hashes are connected by chains of distances within radius
+
+    Args:
+        items (Iterable[tuple[Hashable, int]]): (key, dhash) pairs
+        radius (int): maximum Hamming distance between neighbours
+
+    Returns:
+        list[list[Hashable]]: clusters, single keys included
+    """
+    return build_index(items, radius).get_clusters()
@@ -0,0 +1,239 @@
+import errno
+import os
+import shutil
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# "hardlink" and "symlink" create links instead of copies, "reflink" shares data blocks on copy-on-write
+# filesystems (btrfs, XFS) and falls back to copy_file_range, "copy" copies data
+TRANSFER_MODES = ("copy", "hardlink", "symlink", "reflink")
+
+# Mode tried when the previous one is not supported for a pair of volumes
+_FALLBACKS = {
+    "hardlink": "copy",
+    "symlink": "copy",
+    "reflink": "copy_file_range",
+    "copy_file_range": "copy"
+}
+# Errors meaning the filesystem or the platform can not do this kind of transfer, not that the file is broken
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EINVAL, errno.ENOSYS, errno.ENOTTY,
+    errno.EOPNOTSUPP, getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)
+}
+# linux/fs.h
+_FICLONE = 0x40049409
+_COPY_RANGE_CHUNK = 1 << 30
+
+
+class TransferUnsupported(OSError):
+    pass
+
+
+def _raise_unsupported(e: OSError):
+    if e.errno in _UNSUPPORTED_ERRNOS or getattr(e, "winerror", None) == 1314:
+        # 1314 - symlinks need a privilege on Windows
+        raise TransferUnsupported(e.errno, e.strerror) from e
+    raise e
+
+
+def _is_source_itself(source: str, destination: str) -> bool:
+    """
+    Tells whether destination is the directory entry of source, not a hard link of it or another file
+    """
+    if os.path.islink(destination) or not os.path.exists(destination) or not os.path.samefile(source, destination):
+        return False
+    # Without other links the only name of the file is the source
+    if os.stat(source).st_nlink == 1:
+        return True
+    return (
+        os.path.samefile(os.path.dirname(os.path.abspath(source)), os.path.dirname(os.path.abspath(destination)))
+        and os.path.normcase(os.path.basename(source)) == os.path.normcase(os.path.basename(destination))
+    )
+
+
+def _remove_existing(destination: str):
+    if os.path.lexists(destination):
+        os.remove(destination)
+
+
+def _reflink(source: str, destination: str):
+    if fcntl is None:
+        raise TransferUnsupported(errno.ENOTSUP, "reflink is not available on this platform")
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        try:
+            fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+        except OSError as e:
+            destination_file.close()
+            os.remove(destination)
+            _raise_unsupported(e)
+    shutil.copymode(source, destination)
+
+
+def _copy_file_range(source: str, destination: str, size: int):
+    if not hasattr(os, "copy_file_range"):
+        raise TransferUnsupported(errno.ENOTSUP, "copy_file_range is not available on this platform")
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        # Data is copied by the kernel, network filesystems may copy it on the server without a round trip
+        try:
+            copied = 0
+            while copied < size:
+                chunk = os.copy_file_range(source_file.fileno(), destination_file.fileno(), min(_COPY_RANGE_CHUNK, size - copied))
+                if chunk == 0:
+                    break
+                copied += chunk
+        except OSError as e:
+            destination_file.close()
+            os.remove(destination)
+            _raise_unsupported(e)
+    shutil.copymode(source, destination)
+
+
+def transfer_file(source: str, destination: str, mode: str, size: int):
+    """
+    Transfers one file with exactly this mode, an existing destination is replaced
+
+    Args:
+        source (str): file to transfer
+        destination (str): path of the copy or the link
+        mode (str): one of TRANSFER_MODES or "copy_file_range"
+        size (int): size of source in bytes
+
+    Raises:
+        TransferUnsupported: mode is not supported for these paths, another mode may work
+        shutil.SameFileError: destination is the source itself, nothing is removed
+        OSError: file could not be read or written
+    """
+    # Removing the destination would remove the source then. Symlinks and hard links are only paths, removing them is safe
+    if _is_source_itself(source, destination):
+        raise shutil.SameFileError(f"{source} and {destination} are the same file")
+    # A link left by an earlier run would make a copy overwrite the source itself
+    _remove_existing(destination)
+    if mode == "copy":
+        shutil.copy(source, destination)
+        return
+
+    try:
+        if mode == "hardlink":
+            os.link(source, destination)
+        elif mode == "symlink":
+            os.symlink(os.path.abspath(source), destination)
+        elif mode == "reflink":
+            _reflink(source, destination)
+        elif mode == "copy_file_range":
+            _copy_file_range(source, destination, size)
+        else:
+            raise ValueError(f"Unknown transfer mode {mode}")
+    except TransferUnsupported:
+        raise
+    except OSError as e:
+        _raise_unsupported(e)
+
+
+class TransferPool:
+    """
+    Transfers files on a bounded pool of threads. A mode which is not supported for a source volume
+    falls back to the next one in _FALLBACKS, and later files from that volume start with the working mode.
+    """
+
+    def __init__(
+        self,
+        mode: str = "copy",
+        threads: int = 4,
+        on_transfer: Callable[[str, str, int], None] | None = None,
+        on_error: Callable[[str, OSError], None] | None = None
+    ):
+        """
+        Args:
+            mode (str, optional): one of TRANSFER_MODES. Defaults to "copy".
+            threads (int, optional): worker threads, also twice this many files may wait for a worker. Defaults to 4.
+            on_transfer (Callable[[str, str, int], None] | None, optional): called with the source, the destination
+                and the size after every transfer, from a worker thread. Defaults to None.
+            on_error (Callable[[str, OSError], None] | None, optional): called with the source and the error
+                of a failed transfer, from a worker thread. Defaults to None.
+        """
+        if mode not in TRANSFER_MODES:
+            raise ValueError(f"Unknown transfer mode {mode}")
+        self.mode = mode
+        self.threads = max(1, threads)
+        self.on_transfer = on_transfer
+        self.on_error = on_error
+        # Mode to files, bytes and seconds spent by workers
+        self.stats: dict[str, list[float]] = {}
+        self._device_modes: dict[int, str] = {}
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="transfer")
+        self._futures: set[Future] = set()
+        self._start_time = time.perf_counter()
+        self._wall_time = 0.0
+
+    def submit(self, source: str, destination: str):
+        """
+        Queues a transfer, blocks while the pool is full so memory does not grow with the amount of files
+        """
+        if len(self._futures) >= self.threads * 2:
+            done, self._futures = wait(self._futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        self._futures.add(self._executor.submit(self._transfer, source, destination))
+
+    def close(self):
+        """
+        Waits for every queued transfer and stops the workers
+        """
+        for future in self._futures:
+            future.result()
+        self._futures = set()
+        self._executor.shutdown()
+        self._wall_time = time.perf_counter() - self._start_time
+
+    def _transfer(self, source: str, destination: str):
+        try:
+            stat = os.stat(source)
+            mode = self._device_modes.get(stat.st_dev, self.mode)
+            start = time.perf_counter()
+            while True:
+                try:
+                    transfer_file(source, destination, mode, stat.st_size)
+                    break
+                except TransferUnsupported:
+                    mode = _FALLBACKS.get(mode)
+                    if mode is None:
+                        raise
+                    self._device_modes[stat.st_dev] = mode
+        except OSError as e:
+            if self.on_error is not None:
+                self.on_error(source, e)
+            return
+
+        duration = time.perf_counter() - start
+        with self._lock:
+            stats = self.stats.setdefault(mode, [0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += stat.st_size
+            stats[2] += duration
+        if self.on_transfer is not None:
+            self.on_transfer(source, destination, stat.st_size)
+
+    def format_stats(self) -> str:
+        """
+        Returns:
+            str: files, MB and throughput of every used mode, MB/s of a mode are per worker
+        """
+        lines = []
+        for mode, (files, size, seconds) in sorted(self.stats.items()):
+            speed = size / 2**20 / seconds if seconds > 0 else 0.0
+            lines.append(f"{mode}: {files} files, {size / 2**20:.1f} MB, {speed:.1f} MB/s")
+        total_size = sum(size for _, size, _ in self.stats.values())
+        if lines and self._wall_time > 0:
+            lines.append(
+                f"total: {total_size / 2**20:.1f} MB in {self._wall_time:.2f} s, "
+                f"{total_size / 2**20 / self._wall_time:.1f} MB/s with {self.threads} threads"
+            )
+        return "\n".join(lines)
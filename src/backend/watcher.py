@@ -0,0 +1,237 @@
+import os
+import time
+from threading import Event, Lock
+from typing import Any
+
+from ..utils.logger import get_logger
+from ..utils.signal import Signal
+from .copier import Copier
+from .scaner import Scaner
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+_logger = get_logger(__file__)
+
+# Paths looked up by one query, SQLite before 3.32 allows only 999 variables in a statement
+PATHS_PER_QUERY = 500
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "FolderWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def _changed(self, path: str, is_directory: bool):
+        if not is_directory:
+            self.watcher.on_change(path)
+            return
+        # Files of subfolders are not scanned, events of the folder itself are not reported for them either
+        if not self.watcher.settings["scan_folder_subfolders"]:
+            return
+        # Files of a folder moved or copied in may appear before the folder is watched
+        for file_path, _ in self.watcher.scaner.enumerate_folder(path, True):
+            self.watcher.on_change(file_path)
+
+    def on_created(self, event):
+        self._changed(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._changed(event.src_path, False)
+
+    def on_moved(self, event):
+        self._changed(event.dest_path, event.is_directory)
+
+    def on_closed(self, event):
+        self._changed(event.src_path, False)
+
+
+class FolderWatcher:
+    """
+    Scans files appearing in scan_folder without walking the whole folder again.
+    Changes come from filesystem events (watchdog: inotify, FSEvents, ReadDirectoryChangesW)
+    or from comparing folder snapshots when watchdog is not installed. A file is scanned
+    once it has not changed for watch_debounce seconds, settled files are scanned in batches.
+    """
+
+    default_settings = {
+        # auto, events or polling
+        "watch_backend": "auto",
+        "watch_poll_interval": 5.0,
+        "watch_debounce": 2.0,
+        "watch_batch_size": 256,
+        "watch_initial_scan": True,
+        "watch_auto_copy": False
+    }
+
+    def __init__(self):
+        self.message_signal = Signal()
+        self.batch_scanned_signal = Signal()
+        # Progress of the batch being scanned
+        self.progress_signal = Signal()
+
+        self.settings: dict[str, Any] = {}
+        self.scaner = Scaner()
+        self.scaner.message_signal.connect(self.message_signal.emit)
+        self.scaner.progress_signal.connect(self.progress_signal.emit)
+        self.copier = Copier()
+        self.copier.message_signal.connect(self.message_signal.emit)
+
+        # Path to the time of its last change and its (size, mtime_ns, inode) at that time
+        self._pending: dict[str, tuple[float, tuple[int, int, int]]] = {}
+        self._pending_lock = Lock()
+        self._stop_event = Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def on_change(self, path: str):
+        try:
+            file_key = self.scaner.get_file_key(path)
+        except OSError:
+            return
+        with self._pending_lock:
+            self._pending[path] = (time.monotonic(), file_key)
+
+    def take_settled(self) -> list[tuple[str, tuple[int, int, int]]]:
+        """
+        Removes files which did not change during watch_debounce from pending
+
+        Returns:
+            list[tuple[str, tuple[int, int, int]]]: at most watch_batch_size (path, file key) pairs
+        """
+        now = time.monotonic()
+        with self._pending_lock:
+            candidates = [
+                (path, file_key) for path, (change_time, file_key) in self._pending.items()
+                if now - change_time >= self.settings["watch_debounce"]
+            ]
+
+        settled = []
+        for path, file_key in candidates:
+            try:
+                current_key = self.scaner.get_file_key(path)
+            except OSError:
+                current_key = None
+            with self._pending_lock:
+                if current_key is None:
+                    self._pending.pop(path, None)
+                elif current_key != file_key:
+                    # Still being written, polling does not report every write
+                    self._pending[path] = (now, current_key)
+                elif len(settled) < self.settings["watch_batch_size"]:
+                    del self._pending[path]
+                    settled.append((path, file_key))
+        return settled
+
+    def poll(self, snapshot: dict[str, tuple[int, int, int]]) -> dict[str, tuple[int, int, int]]:
+        """
+        Walks the folder and reports files which are new or changed since snapshot
+
+        Returns:
+            dict[str, tuple[int, int, int]]: new snapshot
+        """
+        current = dict(self.scaner.enumerate_folder(self.settings["scan_folder"], self.settings["scan_folder_subfolders"]))
+        for path, file_key in current.items():
+            if snapshot.get(path) != file_key:
+                self.on_change(path)
+        return current
+
+    def copy_matching(self, paths: list[str]):
+        condition, parameters = self.copier.get_filter()
+        matching = []
+        # The initial scan may bring the whole library, more paths than variables allowed in one statement
+        for start in range(0, len(paths), PATHS_PER_QUERY):
+            chunk = paths[start:start + PATHS_PER_QUERY]
+            placeholders = ", ".join("?" * len(chunk))
+            self.scaner.cursor.execute(
+                f"""
+                    SELECT pictures.md5, files.path FROM files
+                    JOIN pictures ON pictures.md5 = files.md5 AND pictures.hash_algorithm = files.hash_algorithm
+                    WHERE files.path IN ({placeholders}) AND {condition};
+                """,
+                (*chunk, *parameters)
+            )
+            matching.extend(self.scaner.cursor.fetchall())
+        self.copier.start_transfers()
+        try:
+            for md5, path in matching:
+                self.copier.copy_picture(md5, path)
+        finally:
+            self.copier.finish_transfers()
+        for _, path in matching:
+            self.message_signal.emit(f"Copied {path}\n")
+
+    def scan_batch(self, items: list[tuple[str, tuple[int, int, int]]]):
+        self.scaner.scan(items)
+        if self.settings["watch_auto_copy"]:
+            self.copy_matching([path for path, _ in items])
+        _logger.info("Scanned batch of %s files", len(items))
+        self.batch_scanned_signal.emit(len(items))
+
+    def run(self):
+        self.settings = self.default_settings | self.settings
+        self._stop_event.clear()
+        self.scaner.settings = dict(self.settings)
+        try:
+            self.scaner.open_db()
+        except ValueError as e:
+            self.message_signal.emit(f"Wrong settings: {e}\n")
+            return
+        self.copier.settings = dict(self.settings)
+        self.copier.prepare_settings()
+        # Matching files are always copied, a dry run is only a copier run
+        self.copier.settings["copy_dry_run"] = False
+        if self.settings["watch_auto_copy"]:
+            os.makedirs(self.settings["result_copy_folder"], exist_ok=True)
+            # Copies are added to the manifest, so the next copier run does not copy them again
+            self.copier.open_db()
+            self.copier.load_manifest()
+
+        folder = self.settings["scan_folder"]
+        use_events = self.settings["watch_backend"] != "polling" and Observer is not None
+        if self.settings["watch_backend"] != "polling" and Observer is None:
+            self.message_signal.emit("watchdog is not installed, folder is polled instead\n")
+
+        observer = None
+        if use_events:
+            # Started before the initial scan, so files arriving during it are not missed
+            try:
+                observer = Observer()
+                observer.schedule(_EventHandler(self), folder, recursive=self.settings["scan_folder_subfolders"])
+                observer.start()
+            except OSError as e:
+                # inotify watch limit for example
+                self.message_signal.emit(f"Could not watch {folder} for events, folder is polled instead: {e}\n")
+                if observer is not None:
+                    observer.stop()
+                observer = None
+                use_events = False
+
+        try:
+            snapshot: dict[str, tuple[int, int, int]] = {}
+            if self.settings["watch_initial_scan"] or not use_events:
+                snapshot = dict(self.scaner.enumerate_folder(folder, self.settings["scan_folder_subfolders"]))
+            if self.settings["watch_initial_scan"]:
+                # Files added while nothing was watching are new arrivals too
+                changed = [(path, file_key) for path, file_key in snapshot.items() if not self.scaner.is_file_unchanged(path, file_key)]
+                if changed:
+                    self.scan_batch(changed)
+
+            self.message_signal.emit(f"Watching {folder} ({'events' if use_events else 'polling'})\n")
+            next_poll = time.monotonic() + self.settings["watch_poll_interval"]
+            while not self._stop_event.wait(min(0.5, self.settings["watch_debounce"])):
+                if not use_events and time.monotonic() >= next_poll:
+                    snapshot = self.poll(snapshot)
+                    next_poll = time.monotonic() + self.settings["watch_poll_interval"]
+                while items := self.take_settled():
+                    self.scan_batch(items)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
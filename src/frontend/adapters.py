@@ -0,0 +1,102 @@
+# pylint: disable=no-name-in-module, import-outside-toplevel
+from typing import Any
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+# Backends are Qt-free and report through utils.signal.Signal, which calls slots in the worker thread.
+# These wrappers re-emit them as pyqtSignal, so Qt queues the calls to the GUI thread.
+# A backend, and Pillow, numpy and colormath with it, is imported on its first run instead of when the window opens.
+
+
+class _QtEngine(QObject):
+    # Names of engine signals re-emitted by the wrapper, every one is declared as a pyqtSignal of a subclass
+    signal_names: tuple[str, ...] = ()
+    # Emitted when run returns, also after an error
+    finished_signal = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.settings: dict[str, Any] = {}
+        self._engine = None
+
+    def create_engine(self) -> Any:
+        raise NotImplementedError
+
+    @property
+    def engine(self) -> Any:
+        if self._engine is None:
+            self._engine = self.create_engine()
+            for name in self.signal_names:
+                getattr(self._engine, name).connect(getattr(self, name).emit)
+        return self._engine
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            self.engine.settings = self.settings
+            self.engine.run()
+        finally:
+            self.finished_signal.emit()
+
+
+class QtScaner(_QtEngine):
+    initialized_signal = pyqtSignal(int)
+    message_signal = pyqtSignal(str)
+    image_scanned_signal = pyqtSignal(int)
+    progress_signal = pyqtSignal(object)
+    signal_names = ("initialized_signal", "message_signal", "image_scanned_signal", "progress_signal")
+
+    def create_engine(self) -> Any:
+        from ..backend.scaner import Scaner
+        return Scaner()
+
+
+class QtCopier(_QtEngine):
+    initialized_signal = pyqtSignal(int)
+    message_signal = pyqtSignal(str)
+    image_checked_signal = pyqtSignal(int)
+    progress_signal = pyqtSignal(object)
+    signal_names = ("initialized_signal", "message_signal", "image_checked_signal", "progress_signal")
+
+    def create_engine(self) -> Any:
+        from ..backend.copier import Copier
+        return Copier()
+
+
+class QtEnlarger(_QtEngine):
+    initialized_signal = pyqtSignal(int)
+    message_signal = pyqtSignal(str)
+    image_enlarged_signal = pyqtSignal(int)
+    progress_signal = pyqtSignal(object)
+    signal_names = ("initialized_signal", "message_signal", "image_enlarged_signal", "progress_signal")
+
+    def create_engine(self) -> Any:
+        from ..backend.enlarger import EnlargeImages
+        return EnlargeImages()
+
+
+class QtPreviewLoader(QObject):
+    """
+    Loads snapshots for the copy preview in its own thread, so reading a big db does not freeze the window
+    """
+    # Key of the request and the loaded PicturesSnapshot
+    loaded_signal = pyqtSignal(object, object)
+    # Key of the request and the error
+    failed_signal = pyqtSignal(object, str)
+
+    @pyqtSlot(object)
+    def load(self, key: tuple):
+        """
+        Args:
+            key (tuple): path to the db first, the rest is returned with the result as it is
+        """
+        import sqlite3
+
+        from ..backend.preview import PicturesSnapshot
+
+        try:
+            snapshot = PicturesSnapshot.load(key[0])
+        except sqlite3.Error as e:
+            self.failed_signal.emit(key, str(e))
+            return
+        self.loaded_signal.emit(key, snapshot)
@@ -2,20 +2,22 @@ import os
 import sys
 
 # pylint: disable=no-name-in-module
-from PyQt6.QtCore import QThread, pyqtSlot
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QDoubleValidator, QIntValidator
 from PyQt6.QtWidgets import QApplication, QFileDialog, QMainWindow
 
-from ..backend.copier import Copier
-from ..backend.scaner import Scaner
 from ..utils.files_IO import read_json_file, write_json_file
 from ..utils.logger import get_logger
+from .adapters import QtCopier, QtEnlarger, QtPreviewLoader, QtScaner
 from .ui_main_window import Ui_MainWindow
 
 _logger = get_logger(__file__)
 
 
 class MainWindow(Ui_MainWindow, QMainWindow):
+    # Key of a copy preview snapshot to load, see get_copy_preview_key
+    copy_preview_requested = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
         self.setupUi(self)
@@ -39,7 +41,7 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         self.threadsAmountLineEdit.setValidator(QIntValidator())
         self.pixelScanFrequencyLineEdit.setValidator(QIntValidator())
 
-        self.scaner = Scaner()
+        self.scaner = QtScaner()
         self.scaner_thread = QThread()
         self.scaner.moveToThread(self.scaner_thread)
         self.scaner_thread.started.connect(self.scaner.run)
@@ -51,11 +53,24 @@ class MainWindow(Ui_MainWindow, QMainWindow):
                 self.scanFolderLineEdit.setText(directory)
         self.scanFolderButton.pressed.connect(scan_folder_button)
 
+        @pyqtSlot()
+        def on_scan_finished():
+            self.scan_running = False
+            # The copy preview is loaded again once, with every result of the scan
+            self.copy_preview_timer.start()
+        self.scaner.finished_signal.connect(on_scan_finished)
+        self.scan_running = False
+
         @pyqtSlot(int)
         def update_scaner_progress(value):
             self.scanProgressBar.setValue(value)
         self.scaner.image_scanned_signal.connect(update_scaner_progress)
 
+        @pyqtSlot(object)
+        def show_scaner_speed(snapshot):
+            self.scanProgressBar.setFormat(f"%p% ({snapshot.format()})")
+        self.scaner.progress_signal.connect(show_scaner_speed)
+
         @pyqtSlot(int)
         def update_scaner_progress_maximum(value):
             self.scanProgressBar.setMaximum(value)
@@ -77,7 +92,7 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         self.minimumWidthLineEdit.setValidator(QIntValidator())
         self.minimumHeightLineEdit.setValidator(QIntValidator())
 
-        self.copier = Copier()
+        self.copier = QtCopier()
         self.copier_thread = QThread()
         self.copier.moveToThread(self.copier_thread)
         self.copier_thread.started.connect(self.copier.run)
@@ -94,6 +109,11 @@ class MainWindow(Ui_MainWindow, QMainWindow):
             self.copyProgressBar.setValue(value)
         self.copier.image_checked_signal.connect(update_copy_progress)
 
+        @pyqtSlot(object)
+        def show_copier_speed(snapshot):
+            self.copyProgressBar.setFormat(f"%p% ({snapshot.format()})")
+        self.copier.progress_signal.connect(show_copier_speed)
+
         @pyqtSlot(int)
         def update_copy_progress_maximum(value):
             self.copyProgressBar.setMaximum(value)
@@ -104,6 +124,90 @@ class MainWindow(Ui_MainWindow, QMainWindow):
             self.copyOutputField.insertPlainText(message)
         self.copier.message_signal.connect(show_copier_message)
 
+        # Preview is counted a moment after the last keystroke, not on every one
+        self.copy_preview_timer = QTimer(self)
+        self.copy_preview_timer.setSingleShot(True)
+        self.copy_preview_timer.setInterval(300)
+        self.copy_preview_timer.timeout.connect(self.update_copy_preview)
+        for line_edit in (
+            self.dbNameCopierLineEdit, self.maximumDeviationLineEdit, self.sidesRelationLineEdit,
+            self.sidesRelationDeviationLineEdit, self.minimumWidthLineEdit, self.minimumHeightLineEdit
+        ):
+            line_edit.textChanged.connect(self.copy_preview_timer.start)
+        # The db may be rescanned while another tab is open
+        self.tabWidget.currentChanged.connect(self.copy_preview_timer.start)
+        # Key of the snapshot shown and of the one being loaded, the snapshot is None if it could not be read
+        self.copy_preview_snapshot = None
+        self.copy_preview_key = None
+        self.copy_preview_pending_key = None
+
+        self.copy_preview_loader = QtPreviewLoader()
+        self.copy_preview_thread = QThread()
+        self.copy_preview_loader.moveToThread(self.copy_preview_thread)
+        self.copy_preview_requested.connect(self.copy_preview_loader.load)
+
+        @pyqtSlot(object, object)
+        def on_copy_preview_loaded(key, snapshot):
+            self.copy_preview_snapshot = snapshot
+            self.copy_preview_key = key
+            if key == self.copy_preview_pending_key:
+                self.copy_preview_pending_key = None
+            self.update_copy_preview()
+        self.copy_preview_loader.loaded_signal.connect(on_copy_preview_loaded)
+
+        @pyqtSlot(object, str)
+        def on_copy_preview_failed(key, error):
+            _logger.warning("Could not preview %s: %s", key[0], error)
+            on_copy_preview_loaded(key, None)
+        self.copy_preview_loader.failed_signal.connect(on_copy_preview_failed)
+        self.copy_preview_thread.start()
+
+
+        ##############################################################################
+        # Enlarger setup
+        ##############################################################################
+
+        self.enlargeStartButton.pressed.connect(self.run_enlarger)
+
+        self.enlargerMinHeightLineEdit.setValidator(QIntValidator())
+        self.enlargerProcessesLineEdit.setValidator(QIntValidator())
+
+        self.enlarger = QtEnlarger()
+        self.enlarger_thread = QThread()
+        self.enlarger.moveToThread(self.enlarger_thread)
+        self.enlarger_thread.started.connect(self.enlarger.run)
+
+        def connect_folder_button(button, line_edit):
+            @pyqtSlot()
+            def folder_button():
+                directory = self.folder_dialog.getExistingDirectory()
+                if directory != "":
+                    line_edit.setText(directory)
+            button.pressed.connect(folder_button)
+        connect_folder_button(self.enlargerSourceFolderButton, self.enlargerSourceFolderLineEdit)
+        connect_folder_button(self.enlargerResultFolderButton, self.enlargerResultFolderLineEdit)
+        connect_folder_button(self.enlargerSmallFolderButton, self.enlargerSmallFolderLineEdit)
+
+        @pyqtSlot(int)
+        def update_enlarge_progress(value):
+            self.enlargeProgressBar.setValue(value)
+        self.enlarger.image_enlarged_signal.connect(update_enlarge_progress)
+
+        @pyqtSlot(object)
+        def show_enlarger_speed(snapshot):
+            self.enlargeProgressBar.setFormat(f"%p% ({snapshot.format()})")
+        self.enlarger.progress_signal.connect(show_enlarger_speed)
+
+        @pyqtSlot(int)
+        def update_enlarge_progress_maximum(value):
+            self.enlargeProgressBar.setMaximum(value)
+        self.enlarger.initialized_signal.connect(update_enlarge_progress_maximum)
+
+        @pyqtSlot(str)
+        def show_enlarger_message(message):
+            self.enlargerOutputField.insertPlainText(message)
+        self.enlarger.message_signal.connect(show_enlarger_message)
+
     def update_settings(self):
         self.settings["scan_folder"] = self.scanFolderLineEdit.text()
         self.settings["scan_folder_subfolders"] = self.scanFolderSubfoldersCheckBox.isChecked()
@@ -122,6 +226,13 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         self.settings["minimum_height"] = int(self.minimumHeightLineEdit.text())
         self.settings["maximum_deviation"] = int(self.maximumDeviationLineEdit.text())
 
+        self.settings["enlarger_source_folder"] = self.enlargerSourceFolderLineEdit.text()
+        self.settings["enlarger_result_folder"] = self.enlargerResultFolderLineEdit.text()
+        self.settings["enlarger_small_folder"] = self.enlargerSmallFolderLineEdit.text()
+        self.settings["enlarger_aspect_ratio"] = self.enlargerAspectRatioLineEdit.text()
+        self.settings["enlarger_min_height"] = int(self.enlargerMinHeightLineEdit.text())
+        self.settings["enlarger_processes"] = int(self.enlargerProcessesLineEdit.text())
+
         write_json_file(self.settings, self.settings_path)
 
     def retrieve_settings(self):
@@ -147,12 +258,73 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         self.minimumHeightLineEdit.setText(str(self.settings.get("minimum_height", 0)))
         self.maximumDeviationLineEdit.setText(str(self.settings.get("maximum_deviation", 5)))
 
+        self.enlargerSourceFolderLineEdit.setText(self.settings.get("enlarger_source_folder", ""))
+        self.enlargerResultFolderLineEdit.setText(self.settings.get("enlarger_result_folder", ""))
+        self.enlargerSmallFolderLineEdit.setText(self.settings.get("enlarger_small_folder", ""))
+        self.enlargerAspectRatioLineEdit.setText(self.settings.get("enlarger_aspect_ratio", "16x9"))
+        self.enlargerMinHeightLineEdit.setText(str(self.settings.get("enlarger_min_height", 1000)))
+        self.enlargerProcessesLineEdit.setText(str(self.settings.get("enlarger_processes", 24)))
+
+    def get_copy_preview_key(self, db_path: str) -> tuple:
+        """
+        Snapshot of the copier db is loaded again only when the db or its write-ahead log changes.
+        While a scan runs they change all the time, the shown snapshot is kept until the scan finishes
+        """
+        abspath = os.path.abspath(db_path)
+        if self.scan_running and self.copy_preview_key is not None and self.copy_preview_key[0] == abspath:
+            return self.copy_preview_key
+        return (abspath, *(
+            os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in (db_path, f"{db_path}-wal")
+        ))
+
+    @pyqtSlot()
+    def update_copy_preview(self):
+        # pylint: disable=import-outside-toplevel
+        from ..backend.copier import get_ratio_range
+
+        if self.tabWidget.currentWidget() is not self.copierTab:
+            return
+        db_path = f"./{self.dbNameCopierLineEdit.text()}.db"
+        if not os.path.exists(db_path):
+            self.copyPreviewLabel.setText("Подходит: база не найдена")
+            return
+        try:
+            ratio_range = get_ratio_range(self.sidesRelationLineEdit.text(), self.sidesRelationDeviationLineEdit.text())
+            minimum_width = int(self.minimumWidthLineEdit.text())
+            minimum_height = int(self.minimumHeightLineEdit.text())
+            maximum_deviation = int(self.maximumDeviationLineEdit.text())
+        except (ValueError, IndexError, ZeroDivisionError):
+            self.copyPreviewLabel.setText("Подходит: -")
+            return
+
+        key = self.get_copy_preview_key(db_path)
+        if key != self.copy_preview_key:
+            # The result comes to on_copy_preview_loaded, which calls this again
+            if key != self.copy_preview_pending_key:
+                self.copy_preview_pending_key = key
+                self.copy_preview_requested.emit(key)
+            if self.copy_preview_key is None or self.copy_preview_key[0] != key[0]:
+                self.copyPreviewLabel.setText("Подходит: загрузка...")
+                return
+        snapshot = self.copy_preview_snapshot
+        if snapshot is None:
+            self.copyPreviewLabel.setText("Подходит: база не прочитана")
+            return
+
+        preview = snapshot.get_preview(minimum_width, minimum_height, maximum_deviation, ratio_range)
+        self.copyPreviewLabel.setText(
+            f"Подходит: {preview.matching} из {preview.total}   "
+            f"отклонение 0..{preview.bin_edges[-1]:g}: {preview.format_histogram()}"
+        )
+
     def show(self):
         self.retrieve_settings()
         super().show()
+        self.copy_preview_timer.start()
 
     def run_scaner(self):
         self.scanStartButton.setEnabled(False)
+        self.scan_running = True
         self.update_settings()
         self.scaner.settings = self.settings
         self.scaner_thread.start()
@@ -163,8 +335,16 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         self.copier.settings = self.settings
         self.copier_thread.start()
 
+    def run_enlarger(self):
+        self.enlargeStartButton.setEnabled(False)
+        self.update_settings()
+        self.enlarger.settings = self.settings
+        self.enlarger_thread.start()
+
 def start_ui():
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
     app.exec()
+    window.copy_preview_thread.quit()
+    window.copy_preview_thread.wait()
@@ -339,6 +339,11 @@ class Ui_MainWindow(object):
         self.verticalLayout_10.addWidget(self.minimumHeightLineEdit)
         self.horizontalLayout_7.addLayout(self.verticalLayout_10)
         self.verticalLayout_15.addLayout(self.horizontalLayout_7)
+        self.copyPreviewLabel = QtWidgets.QLabel(self.copierTab)
+        self.copyPreviewLabel.setFrameShape(QtWidgets.QFrame.Shape.Box)
+        self.copyPreviewLabel.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        self.copyPreviewLabel.setObjectName("copyPreviewLabel")
+        self.verticalLayout_15.addWidget(self.copyPreviewLabel)
         self.copyStartButton = QtWidgets.QPushButton(self.copierTab)
         self.copyStartButton.setObjectName("copyStartButton")
         self.verticalLayout_15.addWidget(self.copyStartButton)
@@ -353,6 +358,136 @@ class Ui_MainWindow(object):
         self.tabWidget.addTab(self.copierTab, "")
         self.enlargerTab = QtWidgets.QWidget()
         self.enlargerTab.setObjectName("enlargerTab")
+        self.verticalLayout_16 = QtWidgets.QVBoxLayout(self.enlargerTab)
+        self.verticalLayout_16.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout_16.setSpacing(0)
+        self.verticalLayout_16.setObjectName("verticalLayout_16")
+        self.horizontalLayout_10 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_10.setSpacing(0)
+        self.horizontalLayout_10.setObjectName("horizontalLayout_10")
+        self.enlargerSourceFolderLineEdit = QtWidgets.QLineEdit(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerSourceFolderLineEdit.sizePolicy().hasHeightForWidth())
+        self.enlargerSourceFolderLineEdit.setSizePolicy(sizePolicy)
+        self.enlargerSourceFolderLineEdit.setObjectName("enlargerSourceFolderLineEdit")
+        self.horizontalLayout_10.addWidget(self.enlargerSourceFolderLineEdit)
+        self.enlargerSourceFolderButton = QtWidgets.QPushButton(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerSourceFolderButton.sizePolicy().hasHeightForWidth())
+        self.enlargerSourceFolderButton.setSizePolicy(sizePolicy)
+        self.enlargerSourceFolderButton.setObjectName("enlargerSourceFolderButton")
+        self.horizontalLayout_10.addWidget(self.enlargerSourceFolderButton)
+        self.verticalLayout_16.addLayout(self.horizontalLayout_10)
+        self.horizontalLayout_11 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_11.setSpacing(0)
+        self.horizontalLayout_11.setObjectName("horizontalLayout_11")
+        self.enlargerResultFolderLineEdit = QtWidgets.QLineEdit(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerResultFolderLineEdit.sizePolicy().hasHeightForWidth())
+        self.enlargerResultFolderLineEdit.setSizePolicy(sizePolicy)
+        self.enlargerResultFolderLineEdit.setObjectName("enlargerResultFolderLineEdit")
+        self.horizontalLayout_11.addWidget(self.enlargerResultFolderLineEdit)
+        self.enlargerResultFolderButton = QtWidgets.QPushButton(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerResultFolderButton.sizePolicy().hasHeightForWidth())
+        self.enlargerResultFolderButton.setSizePolicy(sizePolicy)
+        self.enlargerResultFolderButton.setObjectName("enlargerResultFolderButton")
+        self.horizontalLayout_11.addWidget(self.enlargerResultFolderButton)
+        self.verticalLayout_16.addLayout(self.horizontalLayout_11)
+        self.horizontalLayout_12 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_12.setSpacing(0)
+        self.horizontalLayout_12.setObjectName("horizontalLayout_12")
+        self.enlargerSmallFolderLineEdit = QtWidgets.QLineEdit(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerSmallFolderLineEdit.sizePolicy().hasHeightForWidth())
+        self.enlargerSmallFolderLineEdit.setSizePolicy(sizePolicy)
+        self.enlargerSmallFolderLineEdit.setObjectName("enlargerSmallFolderLineEdit")
+        self.horizontalLayout_12.addWidget(self.enlargerSmallFolderLineEdit)
+        self.enlargerSmallFolderButton = QtWidgets.QPushButton(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Minimum, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerSmallFolderButton.sizePolicy().hasHeightForWidth())
+        self.enlargerSmallFolderButton.setSizePolicy(sizePolicy)
+        self.enlargerSmallFolderButton.setObjectName("enlargerSmallFolderButton")
+        self.horizontalLayout_12.addWidget(self.enlargerSmallFolderButton)
+        self.verticalLayout_16.addLayout(self.horizontalLayout_12)
+        self.horizontalLayout_13 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_13.setSpacing(0)
+        self.horizontalLayout_13.setObjectName("horizontalLayout_13")
+        self.verticalLayout_17 = QtWidgets.QVBoxLayout()
+        self.verticalLayout_17.setSpacing(0)
+        self.verticalLayout_17.setObjectName("verticalLayout_17")
+        self.enlargerAspectRatioLabel = QtWidgets.QLabel(self.enlargerTab)
+        self.enlargerAspectRatioLabel.setFrameShape(QtWidgets.QFrame.Shape.Box)
+        self.enlargerAspectRatioLabel.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        self.enlargerAspectRatioLabel.setObjectName("enlargerAspectRatioLabel")
+        self.verticalLayout_17.addWidget(self.enlargerAspectRatioLabel)
+        self.enlargerAspectRatioLineEdit = QtWidgets.QLineEdit(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerAspectRatioLineEdit.sizePolicy().hasHeightForWidth())
+        self.enlargerAspectRatioLineEdit.setSizePolicy(sizePolicy)
+        self.enlargerAspectRatioLineEdit.setObjectName("enlargerAspectRatioLineEdit")
+        self.verticalLayout_17.addWidget(self.enlargerAspectRatioLineEdit)
+        self.horizontalLayout_13.addLayout(self.verticalLayout_17)
+        self.verticalLayout_18 = QtWidgets.QVBoxLayout()
+        self.verticalLayout_18.setSpacing(0)
+        self.verticalLayout_18.setObjectName("verticalLayout_18")
+        self.enlargerMinHeightLabel = QtWidgets.QLabel(self.enlargerTab)
+        self.enlargerMinHeightLabel.setFrameShape(QtWidgets.QFrame.Shape.Box)
+        self.enlargerMinHeightLabel.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        self.enlargerMinHeightLabel.setObjectName("enlargerMinHeightLabel")
+        self.verticalLayout_18.addWidget(self.enlargerMinHeightLabel)
+        self.enlargerMinHeightLineEdit = QtWidgets.QLineEdit(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerMinHeightLineEdit.sizePolicy().hasHeightForWidth())
+        self.enlargerMinHeightLineEdit.setSizePolicy(sizePolicy)
+        self.enlargerMinHeightLineEdit.setObjectName("enlargerMinHeightLineEdit")
+        self.verticalLayout_18.addWidget(self.enlargerMinHeightLineEdit)
+        self.horizontalLayout_13.addLayout(self.verticalLayout_18)
+        self.verticalLayout_19 = QtWidgets.QVBoxLayout()
+        self.verticalLayout_19.setSpacing(0)
+        self.verticalLayout_19.setObjectName("verticalLayout_19")
+        self.enlargerProcessesLabel = QtWidgets.QLabel(self.enlargerTab)
+        self.enlargerProcessesLabel.setFrameShape(QtWidgets.QFrame.Shape.Box)
+        self.enlargerProcessesLabel.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        self.enlargerProcessesLabel.setObjectName("enlargerProcessesLabel")
+        self.verticalLayout_19.addWidget(self.enlargerProcessesLabel)
+        self.enlargerProcessesLineEdit = QtWidgets.QLineEdit(self.enlargerTab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.enlargerProcessesLineEdit.sizePolicy().hasHeightForWidth())
+        self.enlargerProcessesLineEdit.setSizePolicy(sizePolicy)
+        self.enlargerProcessesLineEdit.setObjectName("enlargerProcessesLineEdit")
+        self.verticalLayout_19.addWidget(self.enlargerProcessesLineEdit)
+        self.horizontalLayout_13.addLayout(self.verticalLayout_19)
+        self.verticalLayout_16.addLayout(self.horizontalLayout_13)
+        self.enlargeStartButton = QtWidgets.QPushButton(self.enlargerTab)
+        self.enlargeStartButton.setObjectName("enlargeStartButton")
+        self.verticalLayout_16.addWidget(self.enlargeStartButton)
+        self.enlargeProgressBar = QtWidgets.QProgressBar(self.enlargerTab)
+        self.enlargeProgressBar.setMaximum(100)
+        self.enlargeProgressBar.setProperty("value", 0)
+        self.enlargeProgressBar.setObjectName("enlargeProgressBar")
+        self.verticalLayout_16.addWidget(self.enlargeProgressBar)
+        self.enlargerOutputField = QtWidgets.QTextBrowser(self.enlargerTab)
+        self.enlargerOutputField.setObjectName("enlargerOutputField")
+        self.verticalLayout_16.addWidget(self.enlargerOutputField)
         self.tabWidget.addTab(self.enlargerTab, "")
         self.verticalLayout.addWidget(self.tabWidget)
         MainWindow.setCentralWidget(self.centralwidget)
@@ -400,7 +535,22 @@ class Ui_MainWindow(object):
         self.sidesRelationDeviationLineEdit.setText(_translate("MainWindow", "%"))
         self.minimumWidthLabel.setText(_translate("MainWindow", "Минимальная ширина"))
         self.minimumHeightLabel.setText(_translate("MainWindow", "Минимальная высота"))
+        self.copyPreviewLabel.setText(_translate("MainWindow", "Подходит: -"))
         self.copyStartButton.setText(_translate("MainWindow", "Запуск копирования"))
         self.copyProgressBar.setFormat(_translate("MainWindow", "%v/%m (%p%)"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.copierTab), _translate("MainWindow", "Копировальщик"))
+        self.enlargerSourceFolderLineEdit.setPlaceholderText(_translate("MainWindow", "Папка с изображениями..."))
+        self.enlargerSourceFolderButton.setText(_translate("MainWindow", "Выбрать"))
+        self.enlargerResultFolderLineEdit.setPlaceholderText(_translate("MainWindow", "Папка для увеличенных изображений..."))
+        self.enlargerResultFolderButton.setText(_translate("MainWindow", "Выбрать"))
+        self.enlargerSmallFolderLineEdit.setPlaceholderText(_translate("MainWindow", "Папка для изображений ниже минимальной высоты..."))
+        self.enlargerSmallFolderButton.setText(_translate("MainWindow", "Выбрать"))
+        self.enlargerAspectRatioLabel.setText(_translate("MainWindow", "Отношение сторон"))
+        self.enlargerAspectRatioLineEdit.setText(_translate("MainWindow", "16x9"))
+        self.enlargerMinHeightLabel.setText(_translate("MainWindow", "Минимальная высота"))
+        self.enlargerMinHeightLineEdit.setText(_translate("MainWindow", "1000"))
+        self.enlargerProcessesLabel.setText(_translate("MainWindow", "Кол-во процессов"))
+        self.enlargerProcessesLineEdit.setText(_translate("MainWindow", "24"))
+        self.enlargeStartButton.setText(_translate("MainWindow", "Запуск увеличения"))
+        self.enlargeProgressBar.setFormat(_translate("MainWindow", "%v/%m (%p%)"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.enlargerTab), _translate("MainWindow", "Увеличиватель"))
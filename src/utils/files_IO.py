@@ -1,4 +1,5 @@
 import json
+import mmap
 import os
 from typing import Any
 
@@ -19,3 +20,24 @@ def write_json_file(obj: Any, path: str):
         os.makedirs(folder, exist_ok=True)
     with open(path, mode="w", encoding="utf-8") as json_file:
         json.dump(obj, json_file, indent=4)
+
+def read_file_buffer(path: str, mmap_threshold: int = 64 * 1024 * 1024) -> bytes | mmap.mmap:
+    """
+    Loads a whole file with one read, big files are memory mapped instead of copied
+
+    Args:
+        path (str): path and name of the file
+        mmap_threshold (int, optional): files of at least this many bytes are mapped. Defaults to 64 MB.
+
+    Returns:
+        bytes | mmap.mmap: file contents, a mapped file has to be closed by the caller
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if 0 < mmap_threshold <= size:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mmap, "MADV_WILLNEED"):
+                # Pages are read in the background instead of on first access by a worker
+                mapped.madvise(mmap.MADV_WILLNEED)
+            return mapped
+        return file.read()
@@ -0,0 +1,142 @@
+import hashlib
+import mmap
+import os
+from typing import Any
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+CHUNK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+def get_hash_algorithms() -> tuple[str, ...]:
+    """
+    Gets names of hash algorithms available for get_file_hash
+
+    Returns:
+        tuple[str, ...]: algorithm names, xxh3_128 only if xxhash is installed
+    """
+    algorithms = ("md5", "sha1", "blake2b")
+    if xxhash is not None:
+        algorithms += ("xxh3_128",)
+    return algorithms
+
+
+def get_hasher(algorithm: str) -> Any:
+    """
+    Creates hashlib-like object with update and hexdigest methods
+
+    Args:
+        algorithm (str): one of get_hash_algorithms()
+
+    Raises:
+        ValueError: algorithm is unknown or its library is not installed
+
+    Returns:
+        Any: hasher object
+    """
+    if algorithm == "xxh3_128":
+        if xxhash is None:
+            raise ValueError("xxh3_128 requires xxhash package to be installed")
+        return xxhash.xxh3_128()
+    if algorithm not in get_hash_algorithms():
+        raise ValueError(f"Unknown hash algorithm {algorithm}")
+    return hashlib.new(algorithm)
+
+
+def get_hash_name(algorithm: str, partial_size: int = 0) -> str:
+    """
+    Gets name of a hash to store next to the digest
+
+    Args:
+        algorithm (str): one of get_hash_algorithms()
+        partial_size (int, optional): partial hash size in MB, see get_file_hash. Defaults to 0.
+
+    Returns:
+        str: algorithm name, for example "blake2b" or "blake2b-partial-4"
+    """
+    if partial_size > 0:
+        return f"{algorithm}-partial-{partial_size}"
+    return algorithm
+
+
+def _update_from_file(hasher: Any, file: Any, size: int):
+    if size >= MMAP_THRESHOLD:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            hasher.update(mapped)
+        return
+
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    while read_size := file.readinto(buffer):
+        hasher.update(view[:read_size])
+
+
+def get_file_hash(name: str, algorithm: str = "md5", partial_size: int = 0) -> str:
+    """
+    Gets hash of a file
+
+    Args:
+        name (str): path and name to the file
+        algorithm (str, optional): one of get_hash_algorithms(). Defaults to "md5".
+        partial_size (int, optional): if above 0 only size of the file, its first and last partial_size MB
+            are hashed, for quick duplicate pre-checks. Defaults to 0.
+
+    Returns:
+        str: hex digest of a file
+    """
+    hasher = get_hasher(algorithm)
+    size = os.path.getsize(name)
+    partial_bytes = partial_size * 1024 * 1024
+    with open(name, "rb") as file:
+        if partial_bytes <= 0 or size <= partial_bytes * 2:
+            _update_from_file(hasher, file, size)
+        else:
+            hasher.update(size.to_bytes(8, "little"))
+            hasher.update(file.read(partial_bytes))
+            file.seek(size - partial_bytes)
+            hasher.update(file.read(partial_bytes))
+
+    return hasher.hexdigest()
+
+
+def get_data_hash(data: bytes, algorithm: str = "md5", partial_size: int = 0) -> str:
+    """
+    Gets hash of file contents which are already in memory, equal to get_file_hash of the same file
+
+    Args:
+        data (bytes): whole file contents, any bytes-like object such as mmap
+        algorithm (str, optional): one of get_hash_algorithms(). Defaults to "md5".
+        partial_size (int, optional): see get_file_hash. Defaults to 0.
+
+    Returns:
+        str: hex digest of the data
+    """
+    hasher = get_hasher(algorithm)
+    view = memoryview(data)
+    size = len(view)
+    partial_bytes = partial_size * 1024 * 1024
+    if partial_bytes <= 0 or size <= partial_bytes * 2:
+        hasher.update(view)
+    else:
+        hasher.update(size.to_bytes(8, "little"))
+        hasher.update(view[:partial_bytes])
+        hasher.update(view[size - partial_bytes:])
+
+    return hasher.hexdigest()
+
+
+def get_file_md5(name: str) -> str:
+    """
+    Gets md5 of a file
+
+    Args:
+        name (str): path and name to the file
+
+    Returns:
+        str: md5 string of a file
+    """
+    return get_file_hash(name, "md5")
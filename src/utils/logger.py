@@ -16,22 +16,20 @@ def get_logger(
     Args:
         name (str): path and name of the file to log in. Use __file__ variable
         level (str, optional): level of messages to log (ascending order: DEBUG, INFO, WARNING, ERROR, CRITICAL). Defaults to "DEBUG".
-        mode (str, optional): writing mode of log file. Defaults to "a".
+        mode (str, optional): writing mode of log file, applied when the first message is logged. Defaults to "w".
         formatter_string (str, optional): how to format logging string. Defaults to "[%(asctime)s] %(levelname)s [%(pathname)s:%(lineno)d]: %(message)s".
 
     Returns:
         logging.Logger: logging.Logger object
     """
-    if not os.path.exists(logs_path):
-        os.makedirs(logs_path)
-    if not os.path.exists(f"{logs_path}\\{os.path.splitext(os.path.split(name)[-1])[0]}.log"):
-        with open(f"{logs_path}\\{os.path.splitext(os.path.split(name)[-1])[0]}.log", "w", encoding="utf-8"):
-            pass
+    os.makedirs(logs_path, exist_ok=True)
+    log_path = os.path.join(logs_path, f"{os.path.splitext(os.path.basename(name))[0]}.log")
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
-    ch = logging.FileHandler(f"{logs_path}\\{os.path.splitext(os.path.split(name)[-1])[0]}.log", mode, encoding = "utf-8")
+    # delay: the file is opened (and truncated in "w" mode) by the first record, not when a module is imported
+    ch = logging.FileHandler(log_path, mode, encoding="utf-8", delay=True)
     ch.setLevel(level)
 
     formatter = logging.Formatter(formatter_string)
@@ -0,0 +1,98 @@
+import sys
+from threading import Condition
+
+from PIL import Image
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def get_decoded_size(img: Image.Image) -> int:
+    """
+    Estimates memory taken by a decoded image from its header, draft is taken into account
+
+    Args:
+        img (Image.Image): opened, not yet loaded image
+
+    Returns:
+        int: bytes
+    """
+    pixels = img.width * img.height
+    if img.mode.startswith("I;16"):
+        size = pixels * 2
+    elif img.mode in ("I", "F") or len(img.getbands()) > 1:
+        # Pillow keeps every pixel of a multiband image in 4 bytes, RGB and YCbCr included
+        size = pixels * 4
+    else:
+        size = pixels
+    if img.mode in ("P", "1") or img.mode.startswith("I;16"):
+        # Converted to grayscale for the perceptual hash
+        size += pixels
+    return size
+
+
+def get_peak_rss(children: bool = False) -> int | None:
+    """
+    Gets peak resident memory of this process or of its finished child processes
+
+    Args:
+        children (bool, optional): report the biggest waited child process instead. Defaults to False.
+
+    Returns:
+        int | None: bytes, None if the platform does not report it
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    if psutil is not None and not children:
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, "peak_wset", memory_info.rss)
+    return None
+
+
+class MemoryBudget:
+    """
+    Admits work while the sum of reserved sizes fits the limit. Reservations are served in arrival order,
+    an item bigger than the whole limit waits until nothing else is reserved and then runs alone.
+    """
+
+    def __init__(self, limit: int = 0):
+        """
+        Args:
+            limit (int, optional): bytes, 0 disables the budget. Defaults to 0.
+        """
+        self.limit = limit
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._condition = Condition()
+        self._next_ticket = 0
+        self._serving_ticket = 0
+
+    def acquire(self, size: int):
+        if not self.limit:
+            return
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._condition.wait_for(
+                lambda: self._serving_ticket == ticket and (self.in_flight == 0 or self.in_flight + size <= self.limit)
+            )
+            self._serving_ticket += 1
+            self.in_flight += size
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self._condition.notify_all()
+
+    def release(self, size: int):
+        if not self.limit:
+            return
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
@@ -0,0 +1,128 @@
+import time
+from contextlib import nullcontext
+from threading import Lock
+
+import numpy as np
+
+# Returned for every stage when profiling is disabled, entering it costs almost nothing
+_NO_STAGE = nullcontext()
+
+PERCENTILES = (50, 90, 99)
+
+
+class _Stage:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings: dict[str, float], name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class StageProfiler:
+    """
+    Collects durations of processing stages. Per item timings are kept in a dict passed through the
+    processing code, durations which do not belong to one item (queue waits, db flushes) are added separately.
+
+    Usage:
+        timings = profiler.start_item()
+        with profiler.stage(timings, "hash"):
+            ...
+        profiler.add_item(path, timings)
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.items: list[tuple[str, dict[str, float]]] = []
+        self.durations: dict[str, list[float]] = {}
+        self._lock = Lock()
+
+    def start_item(self) -> dict[str, float] | None:
+        """
+        Returns:
+            dict[str, float] | None: timings of a new item, None when profiling is disabled
+        """
+        return {} if self.enabled else None
+
+    def stage(self, timings: dict[str, float] | None, name: str):
+        """
+        Context manager adding its duration to timings[name]
+
+        Args:
+            timings (dict[str, float] | None): timings from start_item
+            name (str): stage name
+
+        Returns:
+            context manager
+        """
+        if timings is None:
+            return _NO_STAGE
+        return _Stage(timings, name)
+
+    def add_item(self, name: str, timings: dict[str, float] | None):
+        if timings is None:
+            return
+        with self._lock:
+            self.items.append((name, timings))
+
+    def add_duration(self, stage: str, seconds: float):
+        with self._lock:
+            self.durations.setdefault(stage, []).append(seconds)
+
+    def pop_items(self) -> list[tuple[str, dict[str, float]]]:
+        """
+        Takes collected items away, used to move them from worker processes to the parent
+
+        Returns:
+            list[tuple[str, dict[str, float]]]: (name, timings) pairs
+        """
+        with self._lock:
+            items, self.items = self.items, []
+        return items
+
+    def extend(self, items: list[tuple[str, dict[str, float]]]):
+        with self._lock:
+            self.items.extend(items)
+
+    def get_summary(self) -> dict[str, dict[str, float]]:
+        """
+        Returns:
+            dict[str, dict[str, float]]: stage name to count, total, mean, percentiles and max in seconds
+        """
+        with self._lock:
+            stages: dict[str, list[float]] = {name: list(values) for name, values in self.durations.items()}
+            for _, timings in self.items:
+                for name, seconds in timings.items():
+                    stages.setdefault(name, []).append(seconds)
+
+        summary = {}
+        for name, values in stages.items():
+            array = np.array(values)
+            summary[name] = {
+                "count": len(array),
+                "total": float(array.sum()),
+                "mean": float(array.mean()),
+                **{f"p{percentile}": float(value) for percentile, value in zip(PERCENTILES, np.percentile(array, PERCENTILES))},
+                "max": float(array.max())
+            }
+        return summary
+
+    def format_summary(self) -> str:
+        """
+        Returns:
+            str: summary as a text table, milliseconds except for total
+        """
+        header = f"{'stage':<12}{'count':>8}{'total s':>10}{'mean':>9}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES) + f"{'max':>9}"
+        lines = [header]
+        for name, stats in sorted(self.get_summary().items()):
+            lines.append(
+                f"{name:<12}{stats['count']:>8}{stats['total']:>10.2f}{stats['mean'] * 1000:>9.2f}"
+                + "".join(f"{stats[f'p{p}'] * 1000:>9.2f}" for p in PERCENTILES)
+                + f"{stats['max'] * 1000:>9.2f}"
+            )
+        return "\n".join(lines)
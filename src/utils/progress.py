@@ -0,0 +1,140 @@
+import logging
+import time
+from dataclasses import dataclass
+from threading import Lock
+
+from .signal import Signal
+
+
+@dataclass(frozen=True)
+class ProgressSnapshot:
+    """
+    State of a long operation at one moment
+    """
+    done: int
+    total: int
+    bytes_done: int
+    elapsed: float
+
+    @property
+    def items_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        """
+        Seconds left at the average speed, None while the speed or the total is unknown
+        """
+        if self.done == 0 or self.total < self.done:
+            return None
+        return (self.total - self.done) / self.items_per_second
+
+    def format(self) -> str:
+        eta = "--:--" if self.eta is None else format_duration(self.eta)
+        return (
+            f"{self.done}/{self.total}, {self.items_per_second:.1f} img/s, "
+            f"{self.bytes_per_second / 2**20:.1f} MB/s, ETA {eta}"
+        )
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Formats seconds as [H:]MM:SS
+
+    Args:
+        seconds (float): duration
+
+    Returns:
+        str: formatted duration
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes:02}:{seconds:02}"
+
+
+class ProgressTracker:
+    """
+    Thread-safe progress counters. Workers call add as often as they like,
+    updated_signal is emitted at most once per interval and once more on finish,
+    so the GUI event loop is not flooded by per-image updates.
+    """
+
+    def __init__(self, interval: float = 0.2, logger: logging.Logger | None = None, log_interval: float = 5.0):
+        self.updated_signal = Signal()
+        self.interval = interval
+        self.logger = logger
+        self.log_interval = log_interval
+
+        self._lock = Lock()
+        self.start()
+
+    def start(self, total: int = 0):
+        """
+        Resets counters and the clock
+
+        Args:
+            total (int, optional): expected amount of items. Defaults to 0.
+        """
+        with self._lock:
+            self._done = 0
+            self._total = total
+            self._bytes_done = 0
+            self._start_time = time.monotonic()
+            self._emit_time = float("-inf")
+            self._log_time = self._start_time
+
+    def set_total(self, total: int):
+        with self._lock:
+            self._total = total
+
+    def add(self, items: int = 0, bytes_amount: int = 0):
+        """
+        Counts processed items and bytes, emits updated_signal if interval has passed
+
+        Args:
+            items (int, optional): processed items. Defaults to 0.
+            bytes_amount (int, optional): read or written bytes. Defaults to 0.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._done += items
+            self._bytes_done += bytes_amount
+            emit = now - self._emit_time >= self.interval
+            log = self.logger is not None and now - self._log_time >= self.log_interval
+            if emit:
+                self._emit_time = now
+            if log:
+                self._log_time = now
+            snapshot = self._snapshot(now) if emit or log else None
+
+        # Slots are called outside the lock, a slow slot only delays the thread which emitted
+        if emit:
+            self.updated_signal.emit(snapshot)
+        if log:
+            self.logger.info("Progress: %s", snapshot.format())
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            return self._snapshot(time.monotonic())
+
+    def finish(self) -> ProgressSnapshot:
+        """
+        Emits and logs the final state regardless of interval
+
+        Returns:
+            ProgressSnapshot: final state
+        """
+        snapshot = self.snapshot()
+        self.updated_signal.emit(snapshot)
+        if self.logger is not None:
+            self.logger.info("Finished: %s in %s", snapshot.format(), format_duration(snapshot.elapsed))
+        return snapshot
+
+    def _snapshot(self, now: float) -> ProgressSnapshot:
+        return ProgressSnapshot(self._done, self._total, self._bytes_done, now - self._start_time)
@@ -0,0 +1,37 @@
+from collections.abc import Callable
+from typing import Any
+
+
+class Signal:
+    """
+    Minimal pyqtSignal-like callback list, so backends can report progress without PyQt6.
+    Slots are called in the thread which emits the signal.
+    """
+
+    def __init__(self):
+        self._slots: list[Callable[..., Any]] = []
+
+    def connect(self, slot: Callable[..., Any]):
+        """
+        Adds a function to call on every emit
+
+        Args:
+            slot (Callable[..., Any]): function taking emitted values
+        """
+        self._slots.append(slot)
+
+    def disconnect(self, slot: Callable[..., Any]):
+        """
+        Removes a function added with connect
+
+        Args:
+            slot (Callable[..., Any]): function to remove
+        """
+        self._slots.remove(slot)
+
+    def emit(self, *args: Any):
+        """
+        Calls every connected function with args
+        """
+        for slot in tuple(self._slots):
+            slot(*args)
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from src.backend.copier import Copier
+
+PICTURES = (
+    # md5, folder, name, width, height, left deviation, right deviation
+    ("a" * 32, "first", "plain.jpg", 1920, 1080, 0.5, 0.5),
+    ("b" * 32, "first", "wide.jpg", 1600, 900, 30.0, 30.0),
+    ("c" * 32, "second", "plain.jpg", 1000, 1500, 1.0, 1.5),
+    ("d" * 32, "second", "striped.jpg", 1000, 1500, 20.0, 3.0)
+)
+
+
+class TestCopier(unittest.TestCase):
+    def setUp(self):
+        # The copier db is looked up in the working directory
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(folder.name)
+
+        connection = sqlite3.connect("pictures.db")
+        connection.execute(
+            """
+                CREATE TABLE pictures(
+                    md5 TEXT PRIMARY KEY, path TEXT, width INT, height INT,
+                    left_deviation REAL, right_deviation REAL, dhash INT
+                );
+            """
+        )
+        self.sources = {}
+        for index, (md5, source_folder, name, width, height, left, right) in enumerate(PICTURES):
+            os.makedirs(source_folder, exist_ok=True)
+            path = os.path.abspath(os.path.join(source_folder, name))
+            with open(path, "wb") as file:
+                file.write(md5.encode() * (index + 1))
+            self.sources[md5] = path
+            connection.execute("INSERT INTO pictures VALUES(?, ?, ?, ?, ?, ?, NULL);", (md5, path, width, height, left, right))
+        connection.commit()
+        connection.close()
+        self.result_folder = os.path.abspath("result")
+
+    def run_copier(self, **settings) -> list[str]:
+        copier = Copier()
+        messages = []
+        copier.message_signal.connect(messages.append)
+        copier.settings = {
+            "copier_db_name": "pictures",
+            "result_copy_folder": self.result_folder,
+            "maximum_deviation": 2
+        } | settings
+        copier.run()
+        return messages
+
+    def get_sync_message(self, messages: list[str]) -> str:
+        return next(message for message in messages if message.startswith(("Sync:", "Dry run:")))
+
+    def get_result(self) -> dict[str, bytes]:
+        result = {}
+        for name in os.listdir(self.result_folder):
+            with open(os.path.join(self.result_folder, name), "rb") as file:
+                result[name] = file.read()
+        return result
+
+    def test_copy(self):
+        self.run_copier()
+        # Both plain pictures are called plain.jpg, the second one found gets an md5 suffix
+        self.assertEqual(self.get_result(), {
+            "plain.jpg": b"a" * 32,
+            f"plain_{'c' * 8}.jpg": b"c" * 32 * 3,
+            "wide.jpg": b"b" * 32 * 2
+        })
+
+    def test_sync_skips_copied(self):
+        self.run_copier()
+        messages = self.run_copier()
+        self.assertIn("0 files to copy (0.0 MB), 3 up to date", self.get_sync_message(messages))
+        # Nothing is transferred
+        self.assertFalse(any(message.startswith("copy:") for message in messages))
+
+    def test_changed_copy_is_copied_again(self):
+        self.run_copier()
+        with open(os.path.join(self.result_folder, "wide.jpg"), "wb") as file:
+            file.write(b"edited")
+        self.assertIn("1 files to copy", self.get_sync_message(self.run_copier()))
+        self.assertEqual(self.get_result()["wide.jpg"], b"b" * 32 * 2)
+
+    def test_user_file_not_overwritten(self):
+        os.makedirs(self.result_folder)
+        with open(os.path.join(self.result_folder, "wide.jpg"), "wb") as file:
+            file.write(b"user")
+        self.run_copier()
+        result = self.get_result()
+        self.assertEqual(result["wide.jpg"], b"user")
+        self.assertEqual(result[f"wide_{'b' * 8}.jpg"], b"b" * 32 * 2)
+
+    def test_dry_run_changes_nothing(self):
+        with sqlite3.connect("pictures.db") as connection:
+            before = list(connection.iterdump())
+        messages = self.run_copier(copy_dry_run=True)
+        self.assertIn("3 files to copy", self.get_sync_message(messages))
+        self.assertFalse(os.path.exists(self.result_folder))
+        with sqlite3.connect("pictures.db") as connection:
+            self.assertEqual(list(connection.iterdump()), before)
+
+    def test_dry_run_after_copy(self):
+        self.run_copier()
+        messages = self.run_copier(copy_dry_run=True)
+        self.assertIn("0 files to copy (0.0 MB), 3 up to date", self.get_sync_message(messages))
+        # Copies made with other settings are copied again
+        messages = self.run_copier(copy_dry_run=True, maximum_deviation=1.2)
+        self.assertIn("2 files to copy (0.0 MB), 0 up to date, 1 no longer matching", self.get_sync_message(messages))
+        self.assertEqual(len(self.get_result()), 3)
+
+    def test_remove_stale(self):
+        self.run_copier()
+        with open(os.path.join(self.result_folder, "user.jpg"), "wb") as file:
+            file.write(b"user")
+
+        # plain.jpg of the second folder does not match anymore, it is kept unless removing is asked for
+        self.run_copier(maximum_deviation=1.2)
+        self.assertIn(f"plain_{'c' * 8}.jpg", self.get_result())
+        self.run_copier(maximum_deviation=1.2, copy_remove_stale=True)
+        # Files the copier did not make are never removed
+        self.assertEqual(set(self.get_result()), {"plain.jpg", "wide.jpg", "user.jpg"})
+
+    def test_mode_change(self):
+        self.run_copier(copy_mode="symlink")
+        destination = os.path.join(self.result_folder, "plain.jpg")
+        self.assertTrue(os.path.islink(destination))
+
+        # Links are replaced by copies, the sources stay
+        self.assertIn("3 files to copy", self.get_sync_message(self.run_copier(copy_mode="copy")))
+        self.assertFalse(os.path.islink(destination))
+        self.assertEqual(self.get_result()["plain.jpg"], b"a" * 32)
+        self.assertIn("3 up to date", self.get_sync_message(self.run_copier(copy_mode="copy")))
+        for md5, path in self.sources.items():
+            with open(path, "rb") as file:
+                self.assertTrue(file.read().startswith(md5.encode()))
+
+
+if __name__ == "__main__":
+    unittest.main()
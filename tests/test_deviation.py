@@ -0,0 +1,204 @@
+import os
+import statistics
+import tempfile
+import unittest
+
+import numpy as np
+# pylint: disable=no-name-in-module
+from colormath.color_conversions import convert_color
+from colormath.color_diff import (delta_e_cie1976, delta_e_cie1994,
+                                  delta_e_cie2000, delta_e_cmc)
+from colormath.color_objects import LabColor, sRGBColor
+from PIL import Image
+
+from src.backend import deviation
+from src.backend.scaner import Scaner
+
+IMAGES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+COLORMATH_DELTA_E = (delta_e_cie1976, delta_e_cmc, delta_e_cie1994, delta_e_cie2000)
+
+
+def to_lab_color(rgb: np.ndarray) -> LabColor:
+    return convert_color(sRGBColor(*rgb.tolist(), is_upscaled=True), LabColor)
+
+
+def get_colormath_scaner(algorithm_index: int) -> Scaner:
+    scaner = Scaner()
+    scaner.settings = Scaner.default_settings | {
+        "deviation_engine": "colormath",
+        "color_algorithm": COLORMATH_DELTA_E[algorithm_index],
+        "color_algorithm_index": algorithm_index,
+        "top_crop": 0.1,
+        "bottom_crop": 0.1,
+        "pixel_scan_frequency": 2
+    }
+    return scaner
+
+
+class TestNumpyEngine(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_srgb_to_lab(self):
+        rgb = self.rng.integers(0, 256, (200, 3))
+        lab = deviation.srgb_to_lab(rgb)
+        for color, lab_color in zip(rgb, lab):
+            expected = to_lab_color(color).get_value_tuple()
+            np.testing.assert_allclose(lab_color, expected, rtol=0, atol=deviation.DELTA_E_TOLERANCE)
+
+    def test_delta_e(self):
+        reference, *others = self.rng.integers(0, 256, (101, 3))
+        reference_lab = to_lab_color(reference)
+        others_lab = [to_lab_color(color) for color in others]
+        for index, colormath_delta_e in enumerate(COLORMATH_DELTA_E):
+            with self.subTest(algorithm=colormath_delta_e.__name__):
+                delta_e = deviation.get_delta_e_function(index)
+                result = delta_e(deviation.srgb_to_lab(reference), deviation.srgb_to_lab(np.array(others)))
+                expected = [colormath_delta_e(reference_lab, color) for color in others_lab]
+                np.testing.assert_allclose(result, expected, rtol=0, atol=deviation.DELTA_E_TOLERANCE)
+
+    def test_edges_deviations(self):
+        # The whole pipeline on real pictures: strips, crops, prevailing color, deviation
+        for name in sorted(os.listdir(IMAGES_FOLDER)):
+            for index in range(len(COLORMATH_DELTA_E)):
+                with self.subTest(image=name, algorithm=index), Image.open(os.path.join(IMAGES_FOLDER, name)) as img:
+                    scaner = get_colormath_scaner(index)
+                    left_strip, right_strip = scaner.get_edge_strips(img)
+                    expected = scaner.get_edges_deviations(left_strip, right_strip)
+
+                    scaner.settings["deviation_engine"] = "numpy"
+                    result = scaner.get_edges_deviations(left_strip, right_strip)
+                    np.testing.assert_allclose(result[:2], expected[:2], rtol=0, atol=deviation.DELTA_E_TOLERANCE)
+
+
+def get_multimode_color(colors: np.ndarray) -> list[int]:
+    # Scaner.get_prevailing_color before the histogram
+    modes = tuple(zip(*statistics.multimode(map(tuple, colors.tolist()))))
+    return [sum(channel) // len(channel) for channel in modes]
+
+
+class TestModeColor(unittest.TestCase):
+    def test_ties_averaged(self):
+        colors = np.array([(10, 20, 30), (21, 0, 255), (0, 0, 0), (10, 20, 30), (21, 0, 255)])
+        self.assertEqual(deviation.get_mode_color(colors).tolist(), [15, 10, 142])
+
+    def test_against_multimode(self):
+        rng = np.random.default_rng(0)
+        for size in (1, 2, 5, 50, 500):
+            for palette_size in (1, 3, 20):
+                with self.subTest(size=size, palette_size=palette_size):
+                    # A small palette makes ties of several modes common
+                    palette = rng.integers(0, 256, (palette_size, 3))
+                    colors = palette[rng.integers(0, palette_size, size)]
+                    self.assertEqual(deviation.get_mode_color(colors).tolist(), get_multimode_color(colors))
+
+    def test_extra_bands_ignored(self):
+        colors = np.array([(1, 2, 3, 0), (1, 2, 3, 255), (4, 5, 6, 255)])
+        self.assertEqual(deviation.get_mode_color(colors).tolist(), [1, 2, 3])
+
+    def test_tolerance_bits(self):
+        colors = np.array([(100, 100, 100), (101, 100, 100), (102, 101, 103), (50, 50, 50), (50, 50, 50)])
+        self.assertEqual(deviation.get_mode_color(colors).tolist(), [50, 50, 50])
+        # Near-identical colors are one bin, the mode is the average color of the bin
+        self.assertEqual(deviation.get_mode_color(colors, 2).tolist(), [101, 100, 101])
+
+    def test_tolerance_bits_ties(self):
+        colors = np.array([(0, 0, 0), (3, 3, 3), (200, 100, 0), (201, 101, 1), (128, 128, 128)])
+        # Bins are averaged first, then the averages of tied bins
+        self.assertEqual(deviation.get_mode_color(colors, 2).tolist(), [100, 50, 0])
+
+
+class TestAdaptiveSampling(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.delta_e = deviation.get_delta_e_function(3)
+
+    def assert_same_decision(self, column: np.ndarray, pixel_scan_frequency: int = 2, threshold: float = 2.0):
+        expected = deviation.get_column_deviation(column, pixel_scan_frequency, self.delta_e)
+        result, _ = deviation.get_column_deviation_adaptive(column, pixel_scan_frequency, self.delta_e, threshold)
+        self.assertEqual(result < threshold, expected < threshold, (result, expected))
+        return result, expected
+
+    def test_full_scan_without_early_exit(self):
+        for height in (1, 2, 5, 63, 100, 777, 2048):
+            for pixel_scan_frequency in (1, 2, 3):
+                with self.subTest(height=height, pixel_scan_frequency=pixel_scan_frequency):
+                    column = self.rng.integers(0, 256, (height, 3))
+                    expected = deviation.get_column_deviation(column, pixel_scan_frequency, self.delta_e)
+                    # An infinite confidence interval never lets it exit early
+                    result, early_exit = deviation.get_column_deviation_adaptive(
+                        column, pixel_scan_frequency, self.delta_e, 2.0, np.inf, 4
+                    )
+                    self.assertFalse(early_exit)
+                    self.assertAlmostEqual(result, expected, delta=deviation.DELTA_E_TOLERANCE)
+
+    def test_striped(self):
+        # Stripes of a power of two width line up with power of two strides
+        for height in (1000, 1080, 2048):
+            for pixel_scan_frequency in (1, 2):
+                for width in (2, 4, 8, 16, 32, 64):
+                    with self.subTest(height=height, pixel_scan_frequency=pixel_scan_frequency, width=width):
+                        column = np.zeros((height, 3), dtype=np.uint8)
+                        column[(np.arange(height) // width) % 2 == 1] = (200, 30, 30)
+                        result, expected = self.assert_same_decision(column, pixel_scan_frequency)
+                        self.assertAlmostEqual(result, expected, delta=expected * 0.35)
+
+    def test_noisy(self):
+        plain = np.full((1500, 3), 120)
+        for amplitude in (0, 1, 40, 128):
+            with self.subTest(amplitude=amplitude):
+                column = np.clip(plain + self.rng.integers(-amplitude, amplitude + 1, plain.shape), 0, 255)
+                self.assert_same_decision(column)
+
+    def test_deterministic(self):
+        column = self.rng.integers(0, 256, (1000, 3))
+        first = deviation.get_column_deviation_adaptive(column, 2, self.delta_e, 2.0)
+        self.assertEqual(deviation.get_column_deviation_adaptive(column, 2, self.delta_e, 2.0), first)
+
+
+class TestLabTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.table = deviation.get_lab_table(8, cls.folder.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        # Tables are cached by path, the file can be removed only when nothing maps it
+        for bits in (6, 8):
+            deviation._lab_tables.pop(os.path.join(cls.folder.name, f"srgb_lab_{bits}.npy"), None) # pylint: disable=protected-access
+        del cls.table
+        cls.folder.cleanup()
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_memory_mapped(self):
+        self.assertIsInstance(self.table, np.memmap)
+        self.assertEqual(self.table.shape, (2 ** 24, 3))
+        self.assertEqual(self.table.dtype, np.float32)
+        self.assertFalse(self.table.flags.writeable)
+        self.assertIs(deviation.get_lab_table(8, self.folder.name), self.table)
+
+    def test_8_bit_table(self):
+        # Every 24 bit color has its own entry, only float32 rounding differs from direct conversion
+        rgb = np.concatenate((self.rng.integers(0, 256, (100000, 3)), [[0, 0, 0], [255, 255, 255], [255, 0, 0], [0, 0, 255]]))
+        result = deviation.pixels_to_lab(rgb, self.table)
+        np.testing.assert_allclose(result, deviation.srgb_to_lab(rgb), rtol=0, atol=deviation.LAB_TABLE_TOLERANCE)
+        for color, lab_color in zip(rgb[:200], result):
+            expected = to_lab_color(color).get_value_tuple()
+            np.testing.assert_allclose(lab_color, expected, rtol=0, atol=deviation.LAB_TABLE_TOLERANCE)
+
+    def test_quantized_table(self):
+        # With 6 bits every color falls into a cell of 4 values per channel represented by its center
+        table = deviation.get_lab_table(6, self.folder.name)
+        self.assertEqual(table.shape, (2 ** 18, 3))
+        rgb = self.rng.integers(0, 256, (10000, 3))
+        centers = (rgb >> 2 << 2) + 1.5
+        np.testing.assert_allclose(
+            deviation.pixels_to_lab(rgb, table), deviation.srgb_to_lab(centers), rtol=0, atol=deviation.LAB_TABLE_TOLERANCE
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
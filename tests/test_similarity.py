@@ -0,0 +1,90 @@
+import os
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from src.backend import similarity
+
+IMAGES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+
+
+def to_signed(value: int) -> int:
+    return value - (1 << similarity.DHASH_BITS) if value >= 1 << (similarity.DHASH_BITS - 1) else value
+
+
+def get_hashes(rng: np.random.Generator, bases_amount: int, copies_amount: int, max_flipped: int) -> list[int]:
+    # Groups of near-duplicates: every copy differs from its base in a few random bits
+    hashes = []
+    for _ in range(bases_amount):
+        base = int(rng.integers(0, 2**63)) | int(rng.integers(0, 2)) << 63
+        hashes.append(to_signed(base))
+        for _ in range(copies_amount):
+            flipped = rng.choice(similarity.DHASH_BITS, int(rng.integers(0, max_flipped + 1)), replace=False)
+            hashes.append(to_signed(base ^ sum(1 << int(bit) for bit in flipped)))
+    return hashes
+
+
+def get_brute_force_clusters(hashes: list[int], radius: int) -> set[frozenset[int]]:
+    clusters = [{key} for key in range(len(hashes))]
+    for first in range(len(hashes)):
+        for second in range(first + 1, len(hashes)):
+            if similarity.get_hamming_distance(hashes[first], hashes[second]) <= radius:
+                first_cluster = next(cluster for cluster in clusters if first in cluster)
+                second_cluster = next(cluster for cluster in clusters if second in cluster)
+                if first_cluster is not second_cluster:
+                    first_cluster |= second_cluster
+                    clusters.remove(second_cluster)
+    return {frozenset(cluster) for cluster in clusters}
+
+
+class TestHammingIndex(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_search(self):
+        hashes = get_hashes(self.rng, 30, 4, 8)
+        for radius in (0, 1, 3, 6, 10):
+            index = similarity.build_index(enumerate(hashes), radius)
+            for query in hashes[::7]:
+                with self.subTest(radius=radius, query=query):
+                    expected = sorted(
+                        (similarity.get_hamming_distance(query, dhash), key)
+                        for key, dhash in enumerate(hashes)
+                        if similarity.get_hamming_distance(query, dhash) <= radius
+                    )
+                    self.assertEqual(sorted(index.search(query)), expected)
+
+    def test_search_smaller_radius(self):
+        hashes = get_hashes(self.rng, 10, 4, 6)
+        index = similarity.build_index(enumerate(hashes), 6)
+        expected = sorted(
+            (similarity.get_hamming_distance(hashes[0], dhash), key)
+            for key, dhash in enumerate(hashes)
+            if similarity.get_hamming_distance(hashes[0], dhash) <= 2
+        )
+        self.assertEqual(sorted(index.search(hashes[0], 2)), expected)
+
+    def test_clusters(self):
+        for radius in (0, 2, 4, 6):
+            for max_flipped in (2, 6):
+                with self.subTest(radius=radius, max_flipped=max_flipped):
+                    hashes = get_hashes(self.rng, 25, 3, max_flipped)
+                    # Equal hashes share one position of the index, their keys still form one cluster
+                    hashes += hashes[:5]
+                    clusters = similarity.get_clusters(enumerate(hashes), radius)
+                    self.assertEqual(sum(len(cluster) for cluster in clusters), len(hashes))
+                    self.assertEqual({frozenset(cluster) for cluster in clusters}, get_brute_force_clusters(hashes, radius))
+
+    def test_dhash(self):
+        for name in sorted(os.listdir(IMAGES_FOLDER)):
+            with self.subTest(image=name), Image.open(os.path.join(IMAGES_FOLDER, name)) as img:
+                dhash = similarity.get_dhash(img)
+                self.assertTrue(-2**63 <= dhash < 2**63)
+                # A smaller copy is a near-duplicate
+                smaller = img.resize((img.width // 2, img.height // 2), Image.Resampling.LANCZOS)
+                self.assertLessEqual(similarity.get_hamming_distance(dhash, similarity.get_dhash(smaller)), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()